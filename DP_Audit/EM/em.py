@@ -0,0 +1,160 @@
+import numpy as np
+import os
+from functools import lru_cache
+from numba import jit, prange
+
+from DP_Audit.distance import MAX_DENSE_NODES, BLOCK_SIZE, distance_matrix_path, load_distance_matrix, ball_mask, is_in_ball
+from DP_Audit.domain import graph_files
+
+def em_cdf_path(graph_file, epsilon, metric="path"):
+    distance_path = distance_matrix_path(graph_file, metric)
+    return distance_path.with_name(distance_path.name.replace("distances", f"em_cdf32_eps{epsilon:g}"))
+
+def load_em_cdf(graph_file, epsilon, metric="path"):
+    """
+    Memory-mapped table of the per-source CDFs of the graph exponential mechanism.
+
+    With utility -d(u, v) and sensitivity the diameter D of the graph, node v is
+    reported for the true node u with probability proportional to exp(-epsilon d(u, v) / (2D)).
+    Row u of the float32 (m, m) table is the cumulative distribution of these
+    probabilities (accumulated in float64, its last entry is exactly 1), computed and
+    cached next to the graph cache on first use. Concurrent builders each write their
+    own temporary file and the last atomic rename wins.
+
+    Parameters:
+    ----------
+    graph_file : str or Path
+        Road-graph pickle, e.g. `Porto/data/porto_graph.pkl`.
+    epsilon : float
+        Privacy budget.
+    metric : str
+        Distance between the nodes, "path" or "haversine" (see DP_Audit.distance).
+
+    Returns:
+    -------
+    cdf : np.ndarray
+        Read-only memory-mapped (m, m) float32 table.
+    """
+    path = em_cdf_path(graph_file, epsilon, metric)
+    if not path.exists():
+        distances = load_distance_matrix(graph_file, metric)
+        m = len(distances)
+        if m > MAX_DENSE_NODES:
+            raise ValueError(f"The exponential mechanism needs the all-pairs distances, limited to {MAX_DENSE_NODES} nodes (got {m}).")
+
+        diameter = max(float(np.max(distances[start:start + BLOCK_SIZE])) for start in range(0, m, BLOCK_SIZE))
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp.npy")
+        cdf = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(m, m))
+        for start in range(0, m, BLOCK_SIZE):
+            block = np.cumsum(np.exp(-epsilon * np.asarray(distances[start:start + BLOCK_SIZE], dtype=np.float64) / (2 * diameter)), axis=1)
+            block /= block[:, -1:]
+            block[:, -1] = 1.0
+            cdf[start:start + len(block)] = block
+        cdf.flush()
+        del cdf
+        os.replace(tmp_path, path)
+    return np.load(path, mmap_mode="r")
+
+@lru_cache(maxsize=2)
+def city_em_cdf(city, epsilon, metric="path"):
+    """
+    CDF table of a city's road graph, built on first use and mapped for the current
+    epsilon only (the tasks of a run are ordered by epsilon).
+    """
+    return load_em_cdf(graph_files[city], epsilon, metric)
+
+def em_mechanism_batch(true_idx, cdf, size, rng):
+    """
+    Vectorized graph exponential mechanism over node indices.
+
+    Parameters:
+    ----------
+    true_idx : int
+        Index of the true node in [0, m-1].
+    cdf : np.ndarray
+        Per-source CDF table (see `load_em_cdf`).
+    size : int
+        Number of reports to draw.
+    rng : np.random.Generator
+        Random generator used for all draws.
+
+    Returns:
+    -------
+    reports : np.ndarray
+        Array of `size` reported node indices.
+    """
+    return np.searchsorted(cdf[true_idx], rng.random(size), side="right")
+
+def em_success_counts(cdf, targets, J, rng, ball_indptr, ball_indices):
+    """
+    Sufficient-statistic simulation of the EM attack.
+
+    The attack guesses the reported node, so a report is a hit with the probability
+    mass the mechanism puts on the eta-ball of the target, read off the CDF table.
+
+    Parameters:
+    ----------
+    cdf : np.ndarray
+        Per-source CDF table (see `load_em_cdf`).
+    targets : np.ndarray
+        Indices of the true nodes in [0, m-1].
+    J : int
+        Number of reports per node.
+    rng : np.random.Generator
+        Random generator used for all draws.
+    ball_indptr, ball_indices : np.ndarray
+        CSR index of the eta-balls.
+
+    Returns:
+    -------
+    hits : np.ndarray
+        Binomial(J, P(report in ball)) hit count for each target.
+    """
+    sizes = ball_indptr[targets + 1] - ball_indptr[targets]
+    rows = np.repeat(targets, sizes)
+    cols = np.concatenate([ball_indices[ball_indptr[v]:ball_indptr[v + 1]] for v in targets]).astype(np.int64)
+    mass = cdf[rows, cols].astype(np.float64) - np.where(cols > 0, cdf[rows, np.maximum(cols - 1, 0)], 0.0)
+    p = np.bincount(np.repeat(np.arange(len(targets)), sizes), weights=mass, minlength=len(targets))
+    return rng.binomial(J, np.clip(p, 0.0, 1.0))
+
+@jit(nopython=True, parallel=True)
+def em_hit_counts(targets, cdf, J, seeds, ball_indptr, ball_indices):
+    """
+    Fused EM mechanism + attack + count kernel.
+
+    Each target node is handled by one prange iteration that seeds its thread's
+    generator with its own seed and draws J reports by binary search in the CDF
+    row of the target; the attack guesses the reported node.
+
+    Parameters:
+    ----------
+    targets : np.ndarray
+        Indices of the true nodes in [0, m-1].
+    cdf : np.ndarray
+        Per-source CDF table (see `load_em_cdf`).
+    J : int
+        Number of reports per target.
+    seeds : np.ndarray
+        One seed of Numba's random generator per target.
+    ball_indptr, ball_indices : np.ndarray
+        CSR index of the eta-balls; a guess hits when it lies in the ball of the target.
+
+    Returns:
+    -------
+    hits : np.ndarray
+        int64 number of hits for each target.
+    """
+    m = cdf.shape[1]
+    hits = np.zeros(len(targets), dtype=np.int64)
+    for i in prange(len(targets)):
+        np.random.seed(seeds[i])
+        v = targets[i]
+        row = cdf[v]
+        in_ball = ball_mask(v, m, ball_indptr, ball_indices)
+        count = 0
+        for _ in range(J):
+            report = np.searchsorted(row, np.random.random(), side="right")
+            if is_in_ball(in_ball, v, report):
+                count += 1
+        hits[i] = count
+    return hits
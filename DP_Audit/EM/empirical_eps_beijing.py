@@ -0,0 +1,7 @@
+import sys
+
+from DP_Audit.run import main
+
+# Graph exponential mechanism audit on the Beijing road graph; see DP_Audit/run.py for the options (e.g. --metric=haversine)
+if __name__ == "__main__":
+    main(["--city", "beijing", "--mechanisms", "EM"] + sys.argv[1:])
@@ -1,12 +1,179 @@
 import numpy as np
 import random
+from numba import jit, prange
 
-def grr_mechanism(true_node, all_nodes, p):
+from DP_Audit.distance import ball_mask, is_in_ball
+
+def grr_mechanism(true_node, domain, p):
     coin = random.random()
 
     if coin <= p:
         return true_node
     else:
-        node_array = np.array(all_nodes)
-        filtered = node_array[node_array != true_node]
-        return np.random.choice(filtered)
\ No newline at end of file
+        # uniform pick among the m-1 other nodes, shifted past the true index
+        index = domain.index(true_node)
+        other = np.random.randint(domain.m - 1)
+        return domain.nodes[other + (other >= index)]
+
+def grr_mechanism_batch(true_idx, m, p, size, rng):
+    """
+    Vectorized Generalized Randomized Response (GRR) over node indices.
+
+    Parameters:
+    ----------
+    true_idx : int
+        Index of the true node in [0, m-1].
+    m : int
+        Domain size (number of graph nodes).
+    p : float
+        Probability of reporting the true node.
+    size : int
+        Number of reports to draw.
+    rng : np.random.Generator
+        Random generator used for all draws.
+
+    Returns:
+    -------
+    reports : np.ndarray
+        Array of `size` reported node indices.
+    """
+    # Draw the replacement from the m-1 other nodes and shift past the true index
+    reports = rng.integers(0, m - 1, size=size)
+    reports += reports >= true_idx
+
+    keep = rng.random(size) <= p
+    reports[keep] = true_idx
+    return reports
+
+def grr_success_counts(m, p, J, rng, size=None, ball_sizes=None):
+    """
+    Sufficient-statistic simulation of the GRR attack.
+
+    The attack guesses the reported node, so a report is a hit exactly when
+    GRR keeps the true node, i.e. with probability p. With eta-balls, a
+    replaced report also hits when it lands in the ball of the true node.
+
+    Parameters:
+    ----------
+    m : int
+        Domain size (number of graph nodes).
+    p : float
+        Probability of reporting the true node.
+    J : int
+        Number of reports per node.
+    rng : np.random.Generator
+        Random generator used for all draws.
+    size : int or None
+        Number of nodes to simulate (default: all m nodes).
+    ball_sizes : np.ndarray or None
+        Size of the eta-ball (true node included) of each simulated node.
+
+    Returns:
+    -------
+    hits : np.ndarray
+        Binomial(J, p) hit count for each simulated node.
+    """
+    if ball_sizes is not None:
+        return rng.binomial(J, p + (1 - p) * (ball_sizes - 1) / (m - 1))
+    return rng.binomial(J, p, size=m if size is None else size)
+
+@jit(nopython=True, parallel=True)
+def grr_hit_counts(targets, m, p, J, seeds, ball_indptr, ball_indices):
+    """
+    Fused GRR mechanism + attack + count kernel.
+
+    Each target node is handled by one prange iteration that seeds its thread's
+    generator with its own seed, draws J reports, guesses the reported node and
+    counts the hits, so only the hit vector leaves native code.
+
+    Parameters:
+    ----------
+    targets : np.ndarray
+        Indices of the true nodes in [0, m-1].
+    m : int
+        Domain size (number of graph nodes).
+    p : float
+        Probability of reporting the true node.
+    J : int
+        Number of reports per target.
+    seeds : np.ndarray
+        One seed of Numba's random generator per target.
+    ball_indptr, ball_indices : np.ndarray
+        CSR index of the eta-balls; a guess hits when it lies in the ball of the target.
+
+    Returns:
+    -------
+    hits : np.ndarray
+        int64 number of hits for each target.
+    """
+    hits = np.zeros(len(targets), dtype=np.int64)
+    for i in prange(len(targets)):
+        np.random.seed(seeds[i])
+        v = targets[i]
+        in_ball = ball_mask(v, m, ball_indptr, ball_indices)
+        count = 0
+        for _ in range(J):
+            if np.random.random() <= p:
+                report = v
+            else:
+                report = np.random.randint(0, m - 1)
+                if report >= v:
+                    report += 1
+            # the attack guesses the reported node
+            if is_in_ball(in_ball, v, report):
+                count += 1
+        hits[i] = count
+    return hits
+
+@jit(nopython=True, parallel=True)
+def grr_sweep_hit_counts(targets, m, ps, J, seeds, ball_indptr, ball_indices):
+    """
+    Fused GRR kernel over a whole epsilon grid with common random numbers.
+
+    Every report draws one uniform u and one replacement node, shared by all grid
+    points: at the grid point with keep probability p the report is the true node
+    iff u <= p, and the replacement otherwise. The hit counts are thus coupled
+    across the grid and non-decreasing in p, and the cost is that of one epsilon.
+
+    Parameters:
+    ----------
+    targets : np.ndarray
+        Indices of the true nodes in [0, m-1].
+    m : int
+        Domain size (number of graph nodes).
+    ps : np.ndarray
+        Keep probabilities of the grid points, in increasing order.
+    J : int
+        Number of reports per target.
+    seeds : np.ndarray
+        One seed of Numba's random generator per target.
+    ball_indptr, ball_indices : np.ndarray
+        CSR index of the eta-balls; a guess hits when it lies in the ball of the target.
+
+    Returns:
+    -------
+    hits : np.ndarray
+        int64 array of shape (len(targets), len(ps)) with the number of hits per target and grid point.
+    """
+    nb_points = len(ps)
+    hits = np.zeros((len(targets), nb_points), dtype=np.int64)
+    for i in prange(len(targets)):
+        np.random.seed(seeds[i])
+        v = targets[i]
+        in_ball = ball_mask(v, m, ball_indptr, ball_indices)
+        # new_hits[e]: reports that hit from grid point e onwards
+        new_hits = np.zeros(nb_points + 1, dtype=np.int64)
+        for _ in range(J):
+            u = np.random.random()
+            report = np.random.randint(0, m - 1)
+            if report >= v:
+                report += 1
+            if is_in_ball(in_ball, v, report):
+                new_hits[0] += 1
+            else:
+                new_hits[np.searchsorted(ps, u)] += 1
+        count = 0
+        for e in range(nb_points):
+            count += new_hits[e]
+            hits[i, e] = count
+    return hits
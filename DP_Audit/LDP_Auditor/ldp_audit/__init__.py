@@ -4,4 +4,5 @@ from .longitudinal_auditor import LongitudinalLDPAuditor
 from .multidimensional_auditor import MultidimensionalLDPAuditor
 from .approximate_ldp import *
 from .attacks import *
+from .batch_protocols import *
 from .utils import *
\ No newline at end of file
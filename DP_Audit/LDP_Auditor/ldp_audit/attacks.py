@@ -3,23 +3,8 @@ import numpy as np
 from numba import jit, prange
 import xxhash
 
-@jit(nopython=True)
-def attack_ss(ss):
-    """
-    Privacy attack to Subset Selection (SS) protocol.
-
-    Parameters:
-    ----------
-    ss : array
-        Obfuscated subset of values.
-
-    Returns:
-    -------
-    int
-        A random inference of the true value.
-    """
-                
-    return np.random.choice(ss)
+# the SS attacks are shared with the graph audits (DP_Audit/SS/ss.py)
+from DP_Audit.SS.ss import attack_ss, attack_ss_batch
 
 @jit(nopython=True)
 def attack_ue(ue_val, k):
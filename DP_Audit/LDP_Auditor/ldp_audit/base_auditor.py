@@ -10,7 +10,6 @@ from collections import defaultdict
 # Import LDP protocols (by default from multi-freq-ldpy package -- https://github.com/hharcolezi/multi-freq-ldpy)
 from multi_freq_ldpy.pure_frequency_oracles.GRR import GRR_Client
 from multi_freq_ldpy.pure_frequency_oracles.UE import UE_Client
-from multi_freq_ldpy.pure_frequency_oracles.SS import SS_Client
 from multi_freq_ldpy.pure_frequency_oracles.LH import LH_Client
 from multi_freq_ldpy.pure_frequency_oracles.HE import HE_Client
 
@@ -19,8 +18,9 @@ from pure_ldp.frequency_oracles.unary_encoding import UEClient, UEServer
 
 # Our imports
 from .utils import setting_seed, find_tresh
-from .attacks import attack_ss, attack_ue, attack_the, attack_she, attack_lh, attack_gm
+from .attacks import attack_ss_batch, attack_ue, attack_the, attack_she, attack_lh, attack_gm
 from .approximate_ldp import find_scale, GM_Client, AGRR_Client, ASUE_Client, ALH_Client
+from .batch_protocols import ss_client_batch
 
 # Imports for parallelization
 import ray
@@ -259,9 +259,15 @@ class LDPAuditor:
         setting_seed(random_state)
         np.random.seed(random_state)
 
+        # draw the reports in chunks of at most ~4M subset entries to bound memory
+        sub_k = int(max(1, np.rint(k / (np.exp(epsilon) + 1))))
+        chunk_size = max(1, (1 << 22) // sub_k)
+
         count = 0
-        for _ in range(trials):
-            count +=  attack_ss(SS_Client(v, k, epsilon)) == test_statistic
+        for start in range(0, trials, chunk_size):
+            # seed Numba's generator explicitly on the first chunk; the next chunks continue its stream
+            subsets = ss_client_batch(v, k, epsilon, min(chunk_size, trials - start), random_state if start == 0 else -1)
+            count += np.sum(attack_ss_batch(subsets) == test_statistic)
         return count
 
     @ray.remote
@@ -0,0 +1,4 @@
+# Batched versions of pure LDP protocols from multi-freq-ldpy (https://github.com/hharcolezi/multi-freq-ldpy)
+# that draw many reports for the same true value in a single Numba call.
+# The SS sampler is shared with the graph audits (DP_Audit/SS/ss.py); the repository root must be on the import path.
+from DP_Audit.SS.ss import ss_client_batch
@@ -1,10 +1,64 @@
 import numpy as np
-from numba import jit
+from numba import jit, prange
 
-def ss_mechanism_graph(true_node, all_nodes, epsilon):
-    k = len(all_nodes)
-    index = all_nodes.index(true_node)
-    return SS_Client(index, k, epsilon)
+from DP_Audit.distance import ball_mask, is_in_ball
+
+def ss_mechanism_graph(true_node, domain, epsilon, n=None, seed=-1):
+    k = domain.m
+    index = domain.index(true_node)
+    if n is None:
+        return SS_Client(index, k, epsilon)
+    # n reports at once as an (n, sub_k) index matrix
+    return ss_client_batch(index, k, epsilon, n, seed)
+
+@jit(nopython=True)
+def ss_parameters(k, epsilon):
+    """
+    Subset size and inclusion probability of the Subset Selection (SS) protocol.
+
+    :param k: attribute's domain size;
+    :param epsilon: privacy guarantee;
+    :return: tuple (sub_k, p_v) with the subset size and the probability that the true value is in the subset.
+    """
+
+    sub_k = int(max(1, np.rint(k / (np.exp(epsilon) + 1))))
+    p_v = sub_k * np.exp(epsilon) / (sub_k * np.exp(epsilon) + k - sub_k)
+    return sub_k, p_v
+
+def ss_success_counts(k, epsilon, J, rng, size=None, ball_sizes=None):
+    """
+    Sufficient-statistic simulation of `attack_ss` against SS.
+
+    The attack hits iff the true value lands in the subset (probability p_v)
+    and the uniform pick out of the sub_k values selects it. Any other pick is
+    uniform over the k-1 other values, so with eta-balls it also hits with
+    probability (ball size - 1)/(k-1).
+
+    Parameters:
+    ----------
+    k : int
+        Domain size (number of graph nodes).
+    epsilon : float
+        Privacy guarantee.
+    J : int
+        Number of reports per node.
+    rng : np.random.Generator
+        Random generator used for all draws.
+    size : int or None
+        Number of nodes to simulate (default: all k nodes).
+    ball_sizes : np.ndarray or None
+        Size of the eta-ball (true value included) of each simulated node.
+
+    Returns:
+    -------
+    hits : np.ndarray
+        Binomial(J, p_v / sub_k) hit count for each simulated node.
+    """
+    sub_k, p_v = ss_parameters(k, epsilon)
+    h = p_v / sub_k
+    if ball_sizes is not None:
+        return rng.binomial(J, h + (1 - h) * (ball_sizes - 1) / (k - 1))
+    return rng.binomial(J, h, size=k if size is None else size)
 
 @jit(nopython=True)
 def SS_Client(input_data, k, epsilon):
@@ -28,8 +82,7 @@ def SS_Client(input_data, k, epsilon):
         domain = np.arange(k)
 
         # SS parameters
-        sub_k = int(max(1, np.rint(k / (np.exp(epsilon) + 1))))
-        p_v = sub_k * np.exp(epsilon) / (sub_k * np.exp(epsilon) + k - sub_k)
+        sub_k, p_v = ss_parameters(k, epsilon)
 
         # SS perturbation function
         rnd = np.random.random()
@@ -61,4 +114,278 @@ def attack_ss(ss):
         A random inference of the true value.
     """
                 
-    return np.random.choice(ss)
\ No newline at end of file
+    return np.random.choice(ss)
+
+@jit(nopython=True)
+def ss_client_batch(v, k, epsilon, n, seed):
+    """
+    Vectorized Subset Selection (SS) protocol drawing n reports for the same true value.
+
+    Each subset is sampled without replacement with Floyd's algorithm over the
+    k-1 values different from v, using a reusable mark buffer, so the cost per
+    report is O(sub_k) instead of O(k).
+
+    :param v: user's true value;
+    :param k: attribute's domain size;
+    :param epsilon: privacy guarantee;
+    :param n: number of reports;
+    :param seed: seed of Numba's random generator (a negative seed keeps its current state);
+    :return: int32 matrix of shape (n, sub_k), one set of sanitized values per row.
+    """
+
+    # Validations
+    if v < 0 or v >= k:
+        raise ValueError('v (integer) should be in the range [0, k-1].')
+    if k < 2:
+        raise ValueError('k needs an integer value >=2.')
+    if epsilon <= 0:
+        raise ValueError('epsilon (float) needs a numerical value greater than 0.')
+
+    if seed >= 0:
+        np.random.seed(seed)
+
+    # SS parameters
+    sub_k, p_v = ss_parameters(k, epsilon)
+
+    subsets = np.empty((n, sub_k), dtype=np.int32)
+    taken = np.zeros(k - 1, dtype=np.bool_)
+    for i in range(n):
+        ss_draw_subset(subsets[i], taken, v, k, sub_k, p_v)
+    return subsets
+
+@jit(nopython=True)
+def attack_ss_batch(subsets):
+    """
+    Privacy attack to Subset Selection (SS) protocol over a batch of reports.
+
+    Parameters:
+    ----------
+    subsets : array
+        Matrix of obfuscated subsets, one report per row.
+
+    Returns:
+    -------
+    array
+        A random inference of the true value for each row.
+    """
+
+    n, sub_k = subsets.shape
+    guesses = np.empty(n, dtype=np.int32)
+    for i in range(n):
+        guesses[i] = subsets[i, np.random.randint(0, sub_k)]
+    return guesses
+
+@jit(nopython=True)
+def ss_draw_subset(subset, taken, v, k, sub_k, p_v):
+    """
+    Draws one SS report for the true value v into `subset` (the sampler of `ss_client_batch` and of the fused kernels).
+
+    :param subset: int32 buffer of length sub_k receiving the report;
+    :param taken: mark buffer of length k-1, all False on entry and on return;
+    :param v: user's true value;
+    :param k: attribute's domain size;
+    :param sub_k: subset size;
+    :param p_v: probability that the true value is in the subset.
+    """
+
+    start = 0
+    if np.random.random() <= p_v:
+        subset[0] = v
+        start = 1
+
+    # Floyd's algorithm on [0, k-2], shifted past v
+    col = start
+    for j in range(k - 1 - (sub_k - start), k - 1):
+        t = np.random.randint(0, j + 1)
+        if taken[t]:
+            t = j
+        taken[t] = True
+        subset[col] = t + 1 if t >= v else t
+        col += 1
+
+    # reset the mark buffer for the next report
+    for c in range(start, sub_k):
+        val = subset[c]
+        taken[val - 1 if val > v else val] = False
+
+@jit(nopython=True, parallel=True)
+def ss_hit_counts(targets, k, epsilon, J, seeds, ball_indptr, ball_indices):
+    """
+    Fused Subset Selection (SS) mechanism + attack + count kernel.
+
+    Each target is handled by one prange iteration with its own seed and mark buffer:
+    the J subsets are drawn as in `ss_client_batch`, attacked as in `attack_ss_batch`
+    and only the number of hits is kept.
+
+    :param targets: true values in [0, k-1];
+    :param k: attribute's domain size;
+    :param epsilon: privacy guarantee;
+    :param J: number of reports per target;
+    :param seeds: one seed of Numba's random generator per target;
+    :param ball_indptr: CSR index pointer of the eta-balls;
+    :param ball_indices: CSR members of the eta-balls; a guess hits when it lies in the ball of the target;
+    :return: int64 number of hits for each target.
+    """
+
+    if k < 2:
+        raise ValueError('k needs an integer value >=2.')
+    if epsilon <= 0:
+        raise ValueError('epsilon (float) needs a numerical value greater than 0.')
+
+    # SS parameters
+    sub_k, p_v = ss_parameters(k, epsilon)
+
+    hits = np.zeros(len(targets), dtype=np.int64)
+    for i in prange(len(targets)):
+        np.random.seed(seeds[i])
+        v = targets[i]
+        subset = np.empty(sub_k, dtype=np.int32)
+        taken = np.zeros(k - 1, dtype=np.bool_)
+        in_ball = ball_mask(v, k, ball_indptr, ball_indices)
+        count = 0
+        for _ in range(J):
+            ss_draw_subset(subset, taken, v, k, sub_k, p_v)
+
+            # attack: uniform pick out of the subset
+            if is_in_ball(in_ball, v, subset[np.random.randint(0, sub_k)]):
+                count += 1
+        hits[i] = count
+    return hits
+
+@jit(nopython=True, parallel=True)
+def ss_score_sums(targets, k, epsilon, J, seeds, ball_indptr, ball_indices):
+    """
+    Fused SS mechanism + Rao-Blackwellized attack kernel.
+
+    Instead of drawing the attack's uniform pick out of each subset, every report is
+    scored with the probability that the pick hits, i.e. the fraction of the subset
+    inside the eta-ball of the target. The scores have the same mean as the hits but
+    a variance about sub_k times smaller when the true value is rarely in the subset.
+
+    :param targets: true values in [0, k-1];
+    :param k: attribute's domain size;
+    :param epsilon: privacy guarantee;
+    :param J: number of reports per target;
+    :param seeds: one seed of Numba's random generator per target;
+    :param ball_indptr: CSR index pointer of the eta-balls;
+    :param ball_indices: CSR members of the eta-balls;
+    :return: tuple (scores, squares) of float64 sums of the scores and of their squares for each target.
+    """
+
+    if k < 2:
+        raise ValueError('k needs an integer value >=2.')
+    if epsilon <= 0:
+        raise ValueError('epsilon (float) needs a numerical value greater than 0.')
+
+    # SS parameters
+    sub_k, p_v = ss_parameters(k, epsilon)
+
+    scores = np.zeros(len(targets), dtype=np.float64)
+    squares = np.zeros(len(targets), dtype=np.float64)
+    for i in prange(len(targets)):
+        np.random.seed(seeds[i])
+        v = targets[i]
+        subset = np.empty(sub_k, dtype=np.int32)
+        taken = np.zeros(k - 1, dtype=np.bool_)
+        in_ball = ball_mask(v, k, ball_indptr, ball_indices)
+        total = 0.0
+        total_sq = 0.0
+        for _ in range(J):
+            ss_draw_subset(subset, taken, v, k, sub_k, p_v)
+            inside = 0
+            for c in range(sub_k):
+                if is_in_ball(in_ball, v, subset[c]):
+                    inside += 1
+            score = inside / sub_k
+            total += score
+            total_sq += score * score
+        scores[i] = total
+        squares[i] = total_sq
+    return scores, squares
+
+@jit(nopython=True)
+def hypergeometric_count(good, bad, n):
+    """
+    Number of good items among n drawn without replacement from good + bad items.
+
+    Sequential draws over the good items (or the sample, if smaller), so the cost is
+    O(min(good, n)) rather than O(n): eta-balls hold few nodes compared to a subset.
+    """
+    total = good + bad
+    count = 0
+    if good <= n:
+        # each good item is drawn with probability (slots left) / (items left)
+        for _ in range(good):
+            if np.random.random() * total < n:
+                count += 1
+                n -= 1
+            total -= 1
+    else:
+        # each slot holds a good item with probability (good items left) / (items left)
+        for _ in range(n):
+            if np.random.random() * total < good:
+                count += 1
+                good -= 1
+            total -= 1
+    return count
+
+@jit(nopython=True, parallel=True)
+def ss_sweep_score_sums(targets, k, epsilons, J, seeds, ball_indptr, ball_indices):
+    """
+    Fused SS kernel with Rao-Blackwellized scores over a whole epsilon grid, with common random numbers.
+
+    The score of a report (see `ss_score_sums`) only depends on whether the true value
+    is in the subset and on how many of the other sub_k values lie in the eta-ball.
+    Every report draws one uniform u, shared by all grid points (the true value is in
+    the subset iff u <= p_v), and the ball counts of nested random prefixes of the
+    other values, from the largest subset size of the grid down with chained
+    hypergeometric draws. The cost per report is O(len(epsilons) x ball size) instead of O(sub_k).
+
+    :param targets: true values in [0, k-1];
+    :param k: attribute's domain size;
+    :param epsilons: privacy guarantees of the grid;
+    :param J: number of reports per target;
+    :param seeds: one seed of Numba's random generator per target;
+    :param ball_indptr: CSR index pointer of the eta-balls;
+    :param ball_indices: CSR members of the eta-balls;
+    :return: tuple (scores, squares) of float64 arrays of shape (len(targets), len(epsilons)).
+    """
+
+    if k < 2:
+        raise ValueError('k needs an integer value >=2.')
+
+    nb_points = len(epsilons)
+    sub_ks = np.empty(nb_points, dtype=np.int64)
+    p_vs = np.empty(nb_points, dtype=np.float64)
+    for e in range(nb_points):
+        if epsilons[e] <= 0:
+            raise ValueError('epsilon (float) needs a numerical value greater than 0.')
+        sub_ks[e], p_vs[e] = ss_parameters(k, epsilons[e])
+
+    # prefix sizes of the other values (sub_k without and with the true value), largest first
+    sizes = np.unique(np.concatenate((sub_ks, sub_ks - 1)))[::-1]
+    without_true = np.searchsorted(-sizes, -sub_ks)
+    with_true = np.searchsorted(-sizes, -(sub_ks - 1))
+
+    scores = np.zeros((len(targets), nb_points), dtype=np.float64)
+    squares = np.zeros((len(targets), nb_points), dtype=np.float64)
+    for i in prange(len(targets)):
+        np.random.seed(seeds[i])
+        v = targets[i]
+        # ball members other than the true value
+        good = ball_indptr[v + 1] - ball_indptr[v] - 1
+        inside = np.empty(len(sizes), dtype=np.int64)
+        for _ in range(J):
+            u = np.random.random()
+            inside[0] = hypergeometric_count(good, k - 1 - good, sizes[0])
+            for c in range(1, len(sizes)):
+                inside[c] = hypergeometric_count(inside[c - 1], sizes[c - 1] - inside[c - 1], sizes[c])
+
+            for e in range(nb_points):
+                if u <= p_vs[e]:
+                    score = (1 + inside[with_true[e]]) / sub_ks[e]
+                else:
+                    score = inside[without_true[e]] / sub_ks[e]
+                scores[i, e] += score
+                squares[i, e] += score * score
+    return scores, squares
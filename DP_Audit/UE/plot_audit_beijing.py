@@ -11,7 +11,11 @@ plot_path = "DP_Audit/UE/plots/EpsEstimation_OUE_Beijing.png"
 df_ours = pd.read_csv(our_results_csv)
 epsilons = df_ours["eps"]
 empirical_epsilons = df_ours["empirical_eps"]
-empirical_epsilons_std = df_ours["std"]
+# error bars: the empirical-epsilon interval when the results have one, else the spread over the repetitions
+if "eps_low" in df_ours:
+    empirical_epsilons_err = [empirical_epsilons - df_ours["eps_low"], df_ours["eps_high"] - empirical_epsilons]
+else:
+    empirical_epsilons_err = df_ours["std"]
 
 # === Load LDP Auditor results ===
 df_comp = pd.read_csv(ldp_auditor_csv)
@@ -26,7 +30,7 @@ plt.figure(figsize=(8, 6))
 plt.errorbar(
     epsilons,
     empirical_epsilons,
-    yerr=empirical_epsilons_std,
+    yerr=empirical_epsilons_err,
     fmt='x',
     ms=10,
     mew=2,
@@ -2,7 +2,9 @@ import numpy as np
 import random
 from numba import jit, prange
 
-def ue_mechanism_graph(true_node, all_nodes, epsilon, optimal=True):
+from DP_Audit.distance import ball_mask, is_in_ball
+
+def ue_mechanism_graph(true_node, domain, epsilon, optimal=True, n=None, seed=-1):
     """
     Graph wrapper for UE Client.
 
@@ -10,21 +12,29 @@ def ue_mechanism_graph(true_node, all_nodes, epsilon, optimal=True):
     ----------
     true_node : hashable
         The true graph node (e.g., a node ID).
-    all_nodes : list
-        List of all possible graph nodes.
+    domain : GraphDomain
+        Graph domain mapping node IDs to indices.
     epsilon : float
         Privacy budget.
     optimal : bool
         Whether to use Optimized Unary Encoding (OUE).
+    n : int or None
+        If given, draw n OUE reports at once in sparse CSR form.
+    seed : int
+        Seed of Numba's random generator for the batch (a negative seed keeps its current state).
 
     Returns:
     -------
-    sanitized_vec : np.ndarray
-        Unary encoded and perturbed vector.
+    sanitized_vec : np.ndarray or tuple
+        Unary encoded and perturbed vector, or (indices, offsets) of the n sparse reports.
     """
-    k = len(all_nodes)
-    index = all_nodes.index(true_node)
-    return UE_Client(index, k, epsilon, optimal)
+    k = domain.m
+    index = domain.index(true_node)
+    if n is None:
+        return UE_Client(index, k, epsilon, optimal)
+    if not optimal:
+        raise ValueError('Sparse batches are only available for OUE (optimal=True).')
+    return oue_client_sparse_batch(index, k, epsilon, n, seed)
 
 
 		
@@ -108,4 +118,343 @@ def attack_ue(ue_val, k):
     if np.sum(ue_val) == 0:
         return np.random.randint(k)
     else:
-        return np.random.choice(np.where(ue_val == 1)[0])
\ No newline at end of file
+        return np.random.choice(np.where(ue_val == 1)[0])
+
+
+@jit(nopython=True)
+def oue_client_sparse_batch(v, k, epsilon, n, seed):
+    """
+    Sparse Optimized Unary Encoding (OUE) drawing n reports for the same true value.
+
+    Only the positions of the bits set to 1 are generated, report by report with
+    `oue_draw_ones`: the true bit is kept with probability 1/2, the number of
+    flipped-on bits among the k-1 other positions is Binomial(k-1, q), and their
+    positions are drawn without replacement with Floyd's algorithm.
+
+    Parameters:
+    ----------
+    v : int
+        True value in [0, k-1].
+    k : int
+        Domain size.
+    epsilon : float
+        Privacy budget.
+    n : int
+        Number of reports.
+    seed : int
+        Seed of Numba's random generator (a negative seed keeps its current state).
+
+    Returns:
+    -------
+    indices : np.ndarray
+        int32 positions of the 1-bits of all reports, row after row (unsorted within a row).
+    offsets : np.ndarray
+        int64 array of length n+1; the 1-bits of report i are indices[offsets[i]:offsets[i+1]].
+    """
+
+    # Validations
+    if v < 0 or v >= k:
+        raise ValueError('v (integer) should be in the range [0, k-1].')
+    if k < 2:
+        raise ValueError('k needs an integer value >=2.')
+    if epsilon <= 0:
+        raise ValueError('epsilon (float) needs a numerical value greater than 0.')
+
+    if seed >= 0:
+        np.random.seed(seed)
+
+    # Optimized parameters
+    p = 1 / 2
+    q = 1 / (np.exp(epsilon) + 1)
+
+    ones = np.empty(k, dtype=np.int32)
+    taken = np.zeros(k - 1, dtype=np.bool_)
+    offsets = np.empty(n + 1, dtype=np.int64)
+    offsets[0] = 0
+    # expected number of 1-bits plus one report of slack, doubled when exceeded
+    indices = np.empty(int(n * (p + (k - 1) * q)) + k, dtype=np.int32)
+    for i in range(n):
+        nb_ones = oue_draw_ones(ones, taken, v, k, p, q)
+        if offsets[i] + nb_ones > len(indices):
+            grown = np.empty(2 * len(indices), dtype=np.int32)
+            grown[:offsets[i]] = indices[:offsets[i]]
+            indices = grown
+        indices[offsets[i]:offsets[i] + nb_ones] = ones[:nb_ones]
+        offsets[i + 1] = offsets[i] + nb_ones
+
+    return indices[:offsets[n]], offsets
+
+
+@jit(nopython=True)
+def attack_ue_sparse(indices, offsets, k):
+    """
+    Privacy attack to Unary Encoding (UE) protocols over a batch of sparse reports.
+
+    Parameters:
+    ----------
+    indices : array
+        Positions of the 1-bits of all reports (CSR format).
+    offsets : array
+        Row offsets into `indices`, of length n+1.
+    k : int
+        Domain size.
+
+    Returns:
+    -------
+    array
+        A random inference of the true value for each report.
+    """
+
+    n = len(offsets) - 1
+    guesses = np.empty(n, dtype=np.int32)
+    for i in range(n):
+        nb_ones = offsets[i + 1] - offsets[i]
+        if nb_ones == 0:
+            guesses[i] = np.random.randint(k)
+        else:
+            guesses[i] = indices[offsets[i] + np.random.randint(0, nb_ones)]
+    return guesses
+
+
+@jit(nopython=True)
+def oue_draw_ones(ones, taken, v, k, p, q):
+    """
+    Draws the 1-bits of one sparse OUE report for the true value v into `ones` (the sampler of `oue_client_sparse_batch` and of the fused kernels).
+
+    Parameters:
+    ----------
+    ones : np.ndarray
+        int32 buffer of length k receiving the positions of the 1-bits.
+    taken : np.ndarray
+        Mark buffer of length k-1, all False on entry and on return.
+    v : int
+        True value in [0, k-1].
+    k : int
+        Domain size.
+    p, q : float
+        Probabilities of keeping the true bit and of flipping on any other bit.
+
+    Returns:
+    -------
+    int
+        Number of 1-bits of the report.
+    """
+    nb_ones = 0
+    if np.random.random() < p:
+        ones[0] = v
+        nb_ones = 1
+
+    # Floyd's algorithm on [0, k-2], shifted past v
+    first = nb_ones
+    flipped = np.random.binomial(k - 1, q)
+    for j in range(k - 1 - flipped, k - 1):
+        t = np.random.randint(0, j + 1)
+        if taken[t]:
+            t = j
+        taken[t] = True
+        ones[nb_ones] = t + 1 if t >= v else t
+        nb_ones += 1
+
+    # reset the mark buffer for the next report
+    for c in range(first, nb_ones):
+        val = ones[c]
+        taken[val - 1 if val > v else val] = False
+    return nb_ones
+
+
+@jit(nopython=True, parallel=True)
+def oue_hit_counts(targets, k, epsilon, J, seeds, ball_indptr, ball_indices):
+    """
+    Fused sparse OUE mechanism + attack + count kernel.
+
+    Each target is handled by one prange iteration with its own seed and buffers:
+    the 1-bits of the J reports are drawn as in `oue_client_sparse_batch`, attacked
+    as in `attack_ue_sparse` and only the number of hits is kept.
+
+    Parameters:
+    ----------
+    targets : np.ndarray
+        True values in [0, k-1].
+    k : int
+        Domain size.
+    epsilon : float
+        Privacy budget.
+    J : int
+        Number of reports per target.
+    seeds : np.ndarray
+        One seed of Numba's random generator per target.
+    ball_indptr, ball_indices : np.ndarray
+        CSR index of the eta-balls; a guess hits when it lies in the ball of the target.
+
+    Returns:
+    -------
+    hits : np.ndarray
+        int64 number of hits for each target.
+    """
+
+    if k < 2:
+        raise ValueError('k needs an integer value >=2.')
+    if epsilon <= 0:
+        raise ValueError('epsilon (float) needs a numerical value greater than 0.')
+
+    # Optimized parameters
+    p = 1 / 2
+    q = 1 / (np.exp(epsilon) + 1)
+
+    hits = np.zeros(len(targets), dtype=np.int64)
+    for i in prange(len(targets)):
+        np.random.seed(seeds[i])
+        v = targets[i]
+        ones = np.empty(k, dtype=np.int32)
+        taken = np.zeros(k - 1, dtype=np.bool_)
+        in_ball = ball_mask(v, k, ball_indptr, ball_indices)
+        count = 0
+        for _ in range(J):
+            nb_ones = oue_draw_ones(ones, taken, v, k, p, q)
+
+            # attack: uniform pick out of the 1-bits, or out of the domain if there are none
+            if nb_ones == 0:
+                guess = np.random.randint(k)
+            else:
+                guess = ones[np.random.randint(0, nb_ones)]
+            if is_in_ball(in_ball, v, guess):
+                count += 1
+        hits[i] = count
+    return hits
+
+
+@jit(nopython=True, parallel=True)
+def oue_score_sums(targets, k, epsilon, J, seeds, ball_indptr, ball_indices):
+    """
+    Fused sparse OUE mechanism + Rao-Blackwellized attack kernel.
+
+    Instead of drawing the attack's uniform pick, every report is scored with the
+    probability that the pick hits: the fraction of its 1-bits inside the eta-ball
+    of the target, or the fraction of the domain in the ball when no bit is set.
+    The scores have the same mean as the hits but a much smaller variance at small
+    epsilon, where the reports have about (k-1)q 1-bits.
+
+    Parameters:
+    ----------
+    targets : np.ndarray
+        True values in [0, k-1].
+    k : int
+        Domain size.
+    epsilon : float
+        Privacy budget.
+    J : int
+        Number of reports per target.
+    seeds : np.ndarray
+        One seed of Numba's random generator per target.
+    ball_indptr, ball_indices : np.ndarray
+        CSR index of the eta-balls.
+
+    Returns:
+    -------
+    tuple
+        (scores, squares): float64 sums of the scores and of their squares for each target.
+    """
+
+    if k < 2:
+        raise ValueError('k needs an integer value >=2.')
+    if epsilon <= 0:
+        raise ValueError('epsilon (float) needs a numerical value greater than 0.')
+
+    # Optimized parameters
+    p = 1 / 2
+    q = 1 / (np.exp(epsilon) + 1)
+
+    scores = np.zeros(len(targets), dtype=np.float64)
+    squares = np.zeros(len(targets), dtype=np.float64)
+    for i in prange(len(targets)):
+        np.random.seed(seeds[i])
+        v = targets[i]
+        ones = np.empty(k, dtype=np.int32)
+        taken = np.zeros(k - 1, dtype=np.bool_)
+        in_ball = ball_mask(v, k, ball_indptr, ball_indices)
+        ball_fraction = (ball_indptr[v + 1] - ball_indptr[v]) / k
+        total = 0.0
+        total_sq = 0.0
+        for _ in range(J):
+            nb_ones = oue_draw_ones(ones, taken, v, k, p, q)
+            if nb_ones == 0:
+                score = ball_fraction
+            else:
+                inside = 0
+                for c in range(nb_ones):
+                    if is_in_ball(in_ball, v, ones[c]):
+                        inside += 1
+                score = inside / nb_ones
+            total += score
+            total_sq += score * score
+        scores[i] = total
+        squares[i] = total_sq
+    return scores, squares
+
+
+@jit(nopython=True, parallel=True)
+def oue_sweep_score_sums(targets, k, epsilons, J, seeds, ball_indptr, ball_indices):
+    """
+    Fused OUE kernel with Rao-Blackwellized scores over a whole epsilon grid, with common random numbers.
+
+    The score of a report (see `oue_score_sums`) only depends on the true bit and on
+    the numbers of other 1-bits inside and outside the eta-ball. The true bit does not
+    depend on epsilon; the two counts are drawn as Binomials at the largest flip
+    probability of the grid and thinned down to the smaller ones, so every bit is on
+    with probability q at each grid point and the reports are nested across the grid.
+    The cost per report is O(len(epsilons)) instead of O(k q).
+
+    Parameters:
+    ----------
+    targets : np.ndarray
+        True values in [0, k-1].
+    k : int
+        Domain size.
+    epsilons : np.ndarray
+        Privacy budgets of the grid, in increasing order.
+    J : int
+        Number of reports per target.
+    seeds : np.ndarray
+        One seed of Numba's random generator per target.
+    ball_indptr, ball_indices : np.ndarray
+        CSR index of the eta-balls.
+
+    Returns:
+    -------
+    tuple
+        (scores, squares): float64 arrays of shape (len(targets), len(epsilons)).
+    """
+
+    if k < 2:
+        raise ValueError('k needs an integer value >=2.')
+
+    nb_points = len(epsilons)
+    qs = np.empty(nb_points, dtype=np.float64)
+    for e in range(nb_points):
+        if epsilons[e] <= 0:
+            raise ValueError('epsilon (float) needs a numerical value greater than 0.')
+        qs[e] = 1 / (np.exp(epsilons[e]) + 1)
+
+    scores = np.zeros((len(targets), nb_points), dtype=np.float64)
+    squares = np.zeros((len(targets), nb_points), dtype=np.float64)
+    for i in prange(len(targets)):
+        np.random.seed(seeds[i])
+        v = targets[i]
+        ball_size = ball_indptr[v + 1] - ball_indptr[v]
+        ball_fraction = ball_size / k
+        for _ in range(J):
+            true_on = 1 if np.random.random() < 0.5 else 0
+            inside = np.random.binomial(ball_size - 1, qs[0])
+            outside = np.random.binomial(k - ball_size, qs[0])
+            for e in range(nb_points):
+                if e > 0:
+                    inside = np.random.binomial(inside, qs[e] / qs[e - 1])
+                    outside = np.random.binomial(outside, qs[e] / qs[e - 1])
+                nb_ones = true_on + inside + outside
+                if nb_ones == 0:
+                    score = ball_fraction
+                else:
+                    score = (true_on + inside) / nb_ones
+                scores[i, e] += score
+                squares[i, e] += score * score
+    return scores, squares
@@ -0,0 +1,386 @@
+"""
+Record-once, attack-many archive of graph LDP reports.
+
+`record` draws the reports of a (mechanism, city, epsilon, seed) audit once and stores
+them as memory-mapped .npy files; `attack` replays one or more attacks over the archive
+with vectorized kernels, so trying a new attack only costs a read of the reports instead
+of a new simulation.
+
+Layout of an archive (e.g. `DP_Audit/SS/archive/porto_eps3_seed42/`):
+    meta.json               mechanism, city, epsilon, seed, m, J and number of targets
+    targets.npy             int32 target nodes; report i belongs to targets[i // J]
+    reports.npy             GRR, EM: int32 reported node per report; SS: int32 (N, sub_k) subsets
+    indices.npy, offsets.npy    OUE: int32 positions of the 1-bits, CSR row offsets (int64)
+
+Attacks:
+    uniform     the attacks of the audits: the reported node (GRR, EM), or a uniform pick
+                out of the subset (SS) or out of the 1-bits (OUE, any node if there are none)
+    map         maximum a posteriori guess under --prior (uniform by default); for GRR, SS
+                and OUE the posterior of v is proportional to prior[v] e^epsilon if v is in
+                the report and to prior[v] otherwise
+
+The targets of an archive are all the nodes, or a uniform --targets subset as in
+DP_Audit.run, so U-ReRo keeps the uniform baseline (1/m, or the mean eta-ball size over m);
+the prior only shapes the MAP attack.
+
+Usage:
+    python -m DP_Audit.archive record --city porto --mechanisms SS OUE --epsilons 1 3 5
+    python -m DP_Audit.archive attack --city porto --mechanisms SS --epsilons 3 --attacks uniform map --prior Porto/data/porto_visit_counts.npy
+"""
+import argparse
+import csv
+import json
+import numpy as np
+import shutil
+
+from numba import jit, prange
+from pathlib import Path
+
+from DP_Audit.audit import MECHANISMS, MC_SAMPLES, REPORT_CHUNK, main_dir, mechanism_folders, grr_probability, report_chunks, epsilon_interval, empirical_epsilon
+from DP_Audit.distance import METRICS, city_balls, identity_balls, eta_kappa
+from DP_Audit.domain import GraphDomain
+from DP_Audit.prior import load_prior, uniform_prior
+from DP_Audit.run import parse_epsilon, target_subset
+from DP_Audit.EM.em import city_em_cdf, em_mechanism_batch
+from DP_Audit.GRR.grr import grr_mechanism_batch
+from DP_Audit.SS.ss import ss_parameters, ss_client_batch
+from DP_Audit.UE.ue import oue_client_sparse_batch
+
+ATTACKS = ["uniform", "map"]
+# reports per parallel block of the MAP kernel; each block holds one mark buffer of m bytes
+MAP_BLOCK = 1 << 16
+
+
+def archive_path(mechanism, city, epsilon, seed, metric="path"):
+    """
+    Directory of the archive of a (mechanism, city, epsilon, seed) audit, e.g. `SS/archive/porto_eps3_seed42`.
+    """
+    tag = f"_{metric}" if mechanism == "EM" and metric != "path" else ""
+    return main_dir / "DP_Audit" / mechanism_folders[mechanism] / "archive" / f"{city}_eps{epsilon:g}_seed{seed}{tag}"
+
+
+def record_archive(mechanism, city, epsilon, seed, samples=MC_SAMPLES, nb_targets=None, metric="path"):
+    """
+    Draws and stores the reports of an audit: J = samples / nb_targets reports for each target.
+
+    The reports of a target are drawn in chunks of at most REPORT_CHUNK node indices and
+    written to memory-mapped files, so the memory use does not depend on the archive size.
+    The archive is built in a temporary directory and renamed when complete; an existing
+    archive is kept as is.
+
+    Returns:
+    -------
+    Path
+        Directory of the archive.
+    """
+    path = archive_path(mechanism, city, epsilon, seed, metric)
+    if path.exists():
+        return path
+
+    m = GraphDomain.from_city(city).m
+    nb_targets = m if nb_targets is None else nb_targets
+    targets = np.arange(m, dtype=np.int32) if nb_targets == m else target_subset(m, nb_targets, seed)
+    J = int(samples / nb_targets)
+    if J < 1:
+        raise ValueError(f"{samples} samples give no report for each of the {nb_targets} targets.")
+    N = nb_targets * J
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(MECHANISMS.index(mechanism), int(round(epsilon * 1e6)))))
+    cdf = city_em_cdf(city, epsilon, metric) if mechanism == "EM" else None
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+    np.save(tmp_path / "targets.npy", targets)
+
+    if mechanism == "OUE":
+        # the number of 1-bits is only known once drawn: stream them to a raw file first
+        offsets = np.lib.format.open_memmap(tmp_path / "offsets.npy", mode="w+", dtype=np.int64, shape=(N + 1,))
+        offsets[0] = 0
+        pos = 0
+        with open(tmp_path / "indices.raw", "wb") as raw:
+            for target in targets:
+                for size in report_chunks(mechanism, m, epsilon, J):
+                    indices, chunk_offsets = oue_client_sparse_batch(target, m, epsilon, size, rng.integers(2**32))
+                    offsets[pos + 1:pos + size + 1] = offsets[pos] + chunk_offsets[1:]
+                    raw.write(indices.tobytes())
+                    pos += size
+        offsets.flush()
+        total = int(offsets[N])
+        del offsets
+
+        raw = np.memmap(tmp_path / "indices.raw", dtype=np.int32, mode="r", shape=(total,)) if total else np.empty(0, dtype=np.int32)
+        indices = np.lib.format.open_memmap(tmp_path / "indices.npy", mode="w+", dtype=np.int32, shape=(total,))
+        for start in range(0, total, REPORT_CHUNK):
+            indices[start:start + REPORT_CHUNK] = raw[start:start + REPORT_CHUNK]
+        indices.flush()
+        del indices, raw
+        (tmp_path / "indices.raw").unlink()
+    else:
+        shape = (N, ss_parameters(m, epsilon)[0]) if mechanism == "SS" else (N,)
+        reports = np.lib.format.open_memmap(tmp_path / "reports.npy", mode="w+", dtype=np.int32, shape=shape)
+        pos = 0
+        for target in targets:
+            for size in report_chunks(mechanism, m, epsilon, J):
+                if mechanism == "GRR":
+                    reports[pos:pos + size] = grr_mechanism_batch(true_idx=target, m=m, p=grr_probability(epsilon, m), size=size, rng=rng)
+                elif mechanism == "SS":
+                    reports[pos:pos + size] = ss_client_batch(target, m, epsilon, size, rng.integers(2**32))
+                else:
+                    reports[pos:pos + size] = em_mechanism_batch(true_idx=target, cdf=cdf, size=size, rng=rng)
+                pos += size
+        reports.flush()
+        del reports
+
+    meta = {"mechanism": mechanism, "city": city, "epsilon": epsilon, "seed": seed, "m": m, "J": J,
+            "targets": nb_targets, "metric": metric}
+    with open(tmp_path / "meta.json", "w") as f:
+        json.dump(meta, f, indent=1)
+    tmp_path.rename(path)
+    return path
+
+
+def load_archive(path):
+    """
+    Metadata and memory-mapped arrays of an archive.
+    """
+    path = Path(path)
+    with open(path / "meta.json") as f:
+        meta = json.load(f)
+    arrays = {file.stem: np.load(file, mmap_mode="r") for file in path.glob("*.npy")}
+    return meta, arrays
+
+
+def report_batches(meta, arrays):
+    """
+    Iterates over the reports of an archive in chunks of about REPORT_CHUNK node indices.
+
+    Yields:
+    ------
+    tuple
+        (truths, indices, offsets): the int32 true node of each report of the chunk and
+        the reports in CSR form, the nodes of report i being indices[offsets[i]:offsets[i+1]].
+    """
+    J, targets = meta["J"], arrays["targets"]
+    N = len(targets) * J
+    if meta["mechanism"] == "OUE":
+        all_offsets = arrays["offsets"]
+        row_size = max(1, int(all_offsets[N]) // max(N, 1))
+    else:
+        reports = arrays["reports"]
+        row_size = reports.shape[1] if reports.ndim == 2 else 1
+    chunk = max(1, REPORT_CHUNK // row_size)
+
+    for start in range(0, N, chunk):
+        stop = min(start + chunk, N)
+        truths = targets[np.arange(start, stop) // J]
+        if meta["mechanism"] == "OUE":
+            offsets = np.asarray(all_offsets[start:stop + 1])
+            indices = np.asarray(arrays["indices"][offsets[0]:offsets[-1]])
+            yield truths, indices, offsets - offsets[0]
+        else:
+            indices = np.asarray(reports[start:stop]).ravel()
+            yield truths, indices, np.arange(stop - start + 1, dtype=np.int64) * row_size
+
+
+def uniform_attack(indices, offsets, m, rng):
+    """
+    Vectorized uniform pick out of each report; an empty report gives a uniform guess over the m nodes.
+    """
+    sizes = np.diff(offsets)
+    picks = offsets[:-1] + np.floor(rng.random(len(sizes)) * sizes).astype(np.int64)
+    guesses = rng.integers(0, m, size=len(sizes), dtype=np.int32)
+    nonempty = sizes > 0
+    guesses[nonempty] = indices[picks[nonempty]]
+    return guesses
+
+
+@jit(nopython=True, parallel=True)
+def map_attack(indices, offsets, prior, order, nb_top, ratio, seeds):
+    """
+    Maximum a posteriori guess for reports whose likelihood is `ratio` times larger for the reported nodes.
+
+    The best reported node maximizes the prior (ties broken uniformly); the best other
+    node is the first one outside the report in `order`, the nodes by decreasing prior
+    with random tie-breaking. An empty report gives one of the nb_top most likely nodes.
+
+    Parameters:
+    ----------
+    indices, offsets : np.ndarray
+        Reports in CSR form.
+    prior : np.ndarray
+        Prior over the m nodes.
+    order : np.ndarray
+        Node indices by decreasing prior.
+    nb_top : int
+        Number of nodes with the largest prior.
+    ratio : float
+        Likelihood ratio between the reported and the other nodes (e^epsilon for GRR, SS and OUE).
+    seeds : np.ndarray
+        One seed of Numba's random generator per block of MAP_BLOCK reports.
+
+    Returns:
+    -------
+    guesses : np.ndarray
+        int32 guess of each report.
+    """
+    n = len(offsets) - 1
+    m = len(prior)
+    guesses = np.empty(n, dtype=np.int32)
+    for b in prange(len(seeds)):
+        np.random.seed(seeds[b])
+        marked = np.zeros(m, dtype=np.bool_)
+        for i in range(b * MAP_BLOCK, min((b + 1) * MAP_BLOCK, n)):
+            if offsets[i] == offsets[i + 1]:
+                guesses[i] = order[np.random.randint(0, nb_top)]
+                continue
+
+            best = -1
+            best_weight = -1.0
+            ties = 0
+            for j in range(offsets[i], offsets[i + 1]):
+                u = indices[j]
+                marked[u] = True
+                if prior[u] > best_weight:
+                    best, best_weight, ties = u, prior[u], 1
+                elif prior[u] == best_weight:
+                    ties += 1
+                    if np.random.randint(0, ties) == 0:
+                        best = u
+
+            other = -1
+            for j in range(m):
+                if not marked[order[j]]:
+                    other = order[j]
+                    break
+            for j in range(offsets[i], offsets[i + 1]):
+                marked[indices[j]] = False
+
+            guesses[i] = best if other < 0 or ratio * best_weight >= prior[other] else other
+    return guesses
+
+
+@jit(nopython=True, parallel=True)
+def ball_hit_count(guesses, truths, ball_indptr, ball_indices):
+    """
+    Number of guesses inside the eta-ball of their true node (the balls are sorted CSR rows).
+    """
+    hits = 0
+    for i in prange(len(guesses)):
+        ball = ball_indices[ball_indptr[truths[i]]:ball_indptr[truths[i] + 1]]
+        pos = np.searchsorted(ball, guesses[i])
+        if pos < len(ball) and ball[pos] == guesses[i]:
+            hits += 1
+    return hits
+
+
+def replay_archive(path, attacks, prior=None, balls=None, seed=0):
+    """
+    Replays attacks over the reports of an archive.
+
+    Parameters:
+    ----------
+    path : str or Path
+        Directory of the archive.
+    attacks : list
+        Names of the attacks (see ATTACKS).
+    prior : np.ndarray or None
+        Prior of the MAP attack; uniform by default.
+    balls : tuple or None
+        CSR index of the eta-balls; None for eta = 0.
+    seed : int
+        Seed of the attacks' own randomness.
+
+    Returns:
+    -------
+    tuple
+        (hits, trials, correction): the number of successful reconstructions of each
+        attack, the number of reports and the summed uniform-guess baseline.
+    """
+    meta, arrays = load_archive(path)
+    m, epsilon = meta["m"], meta["epsilon"]
+    if "map" in attacks and meta["mechanism"] == "EM":
+        raise ValueError("The MAP attack needs the two-level likelihood of GRR, SS and OUE.")
+    ball_indptr, ball_indices = identity_balls(m) if balls is None else balls
+    rng = np.random.default_rng(seed)
+
+    if "map" in attacks:
+        prior = uniform_prior(m) if prior is None else prior
+        order = np.lexsort((rng.random(m), -prior)).astype(np.int32)
+        nb_top = int(np.sum(prior == prior.max()))
+
+    hits = {attack: 0 for attack in attacks}
+    trials = 0
+    for truths, indices, offsets in report_batches(meta, arrays):
+        for attack in attacks:
+            if attack == "uniform":
+                guesses = uniform_attack(indices, offsets, m, rng)
+            elif attack == "map":
+                seeds = rng.integers(2**32, size=-(-len(truths) // MAP_BLOCK))
+                guesses = map_attack(indices, offsets, prior, order, nb_top, np.exp(epsilon), seeds)
+            else:
+                raise ValueError(f"Unsupported attack: {attack}")
+            hits[attack] += int(ball_hit_count(guesses, truths, ball_indptr, ball_indices))
+        trials += len(truths)
+
+    targets = np.asarray(arrays["targets"])
+    correction = float(meta["J"] * np.sum(ball_indptr[targets + 1] - ball_indptr[targets]) / m)
+    return hits, trials, correction
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record-once, attack-many archive of graph LDP reports.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in [("record", "draw and store the reports"), ("attack", "replay attacks over stored reports")]:
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.add_argument("--city", choices=["porto", "beijing"], required=True)
+        subparser.add_argument("--mechanisms", nargs="+", choices=MECHANISMS, default=["GRR", "SS", "OUE"])
+        subparser.add_argument("--epsilons", nargs="+", type=parse_epsilon, required=True)
+        subparser.add_argument("--seed", type=int, default=42, help="seed of the recorded reports")
+        subparser.add_argument("--metric", choices=METRICS, default="path", help="distance used with --eta and by EM")
+    record_parser, attack_parser = subparsers.choices["record"], subparsers.choices["attack"]
+    record_parser.add_argument("--samples", type=int, default=MC_SAMPLES, help="number of reports per archive")
+    record_parser.add_argument("--targets", type=int, default=None, help="record a uniform random subset of this many target nodes")
+    attack_parser.add_argument("--attacks", nargs="+", choices=ATTACKS, default=["uniform"])
+    attack_parser.add_argument("--prior", default=None, help="node weights (.npy or .csv, in graph-cache node order) of the MAP attack")
+    attack_parser.add_argument("--eta", type=float, default=0.0, help="guesses within eta meters of the true node count as hits")
+    attack_parser.add_argument("--alpha", type=float, default=1e-2, help="significance level of the ReRo intervals")
+    attack_parser.add_argument("--attack-seed", type=int, default=0, help="seed of the attacks' own randomness")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        for mechanism in args.mechanisms:
+            for epsilon in args.epsilons:
+                path = record_archive(mechanism, args.city, epsilon, args.seed, args.samples, args.targets, args.metric)
+                print(f"{mechanism} Eps: {epsilon} -> {path}")
+        return
+
+    if "EM" in args.mechanisms and args.eta > 0:
+        parser.error("--eta assumes a mechanism symmetric in the non-target nodes, which EM is not")
+    domain = GraphDomain.from_city(args.city)
+    prior = None if args.prior is None else load_prior(args.prior, domain.m)
+    balls = city_balls(args.city, args.eta, args.metric) if args.eta > 0 else None
+    kap = eta_kappa(balls[0]) if balls is not None else None
+    for mechanism in args.mechanisms:
+        for epsilon in args.epsilons:
+            path = archive_path(mechanism, args.city, epsilon, args.seed, args.metric)
+            if not path.exists():
+                parser.error(f"no archive at {path}; run the record command first")
+            hits, trials, correction = replay_archive(path, args.attacks, prior, balls, args.attack_seed)
+
+            new_file = not (path / "attacks.csv").exists()
+            with open(path / "attacks.csv", mode="a", newline="") as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(["attack", "prior", "eta", "metric", "trials", "ReRo", "U-ReRo", "empirical_eps", "eps_low", "eps_high"])
+                for attack in args.attacks:
+                    u_rero = (hits[attack] - correction) / trials
+                    emp_eps = float(empirical_epsilon(mechanism, u_rero, domain.m, kap))
+                    eps_low, eps_high = epsilon_interval(mechanism, hits[attack], trials, domain.m, args.alpha, correction / trials, kap)
+                    writer.writerow([attack, "" if args.prior is None else Path(args.prior).stem, args.eta, args.metric, trials,
+                                     hits[attack] / trials, u_rero, emp_eps, eps_low, eps_high])
+                    print(f"{mechanism} Eps: {epsilon}, attack: {attack}, ReRo: {hits[attack] / trials:.4e}, "
+                          f"empirical eps: {emp_eps}, interval: [{eps_low}, {eps_high}]")
+
+
+if __name__ == "__main__":
+    main()
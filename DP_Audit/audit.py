@@ -0,0 +1,309 @@
+import csv
+import math
+import numpy as np
+
+from pathlib import Path
+
+from DP_Audit.confidence import INTERVALS, empirical_bernstein
+from DP_Audit.distance import identity_balls
+from DP_Audit.inversion import invert_rad
+from DP_Audit.GRR.grr import grr_mechanism_batch, grr_success_counts, grr_hit_counts, grr_sweep_hit_counts
+from DP_Audit.SS.ss import ss_parameters, ss_client_batch, attack_ss_batch, ss_success_counts, ss_hit_counts, ss_score_sums, ss_sweep_score_sums
+from DP_Audit.UE.ue import oue_client_sparse_batch, attack_ue_sparse, oue_hit_counts, oue_score_sums, oue_sweep_score_sums
+from DP_Audit.EM.em import em_mechanism_batch, em_success_counts, em_hit_counts
+
+# file imports
+main_dir = Path(__file__).parent.parent
+
+###### Audit parameters #######
+MECHANISMS = ["GRR", "SS", "OUE", "EM"]
+EPSILONS = range(1,20)
+MC_SAMPLES = 1000000
+# one pooled run; the binomial interval on the pooled hit counts replaces the spread over repetitions
+REPETITIONS = 1
+MODES = ["fused", "full", "sufficient", "sweep"]
+# "rao-blackwell" scores each report with the probability that the attack's random pick hits
+ESTIMATORS = ["hits", "rao-blackwell"]
+# node indices held at once by the reports of mode "full" (64MB of int32), whatever m and J
+REPORT_CHUNK = 1 << 24
+
+# folder and file tag of each mechanism's results
+mechanism_folders = {"GRR": "GRR", "SS": "SS", "OUE": "UE", "EM": "EM"}
+mechanism_tags = {"GRR": "", "SS": "", "OUE": "_oue", "EM": ""}
+
+
+def result_paths(mechanism, city, tag=""):
+    """
+    Paths of the epsilon estimation and attack result CSVs of a (mechanism, city) audit.
+
+    `tag` is appended to the file names of audit variants, e.g. the name of a prior.
+
+    Returns:
+    -------
+    tuple
+        (result_path, attack_result_path), e.g. `SS/results/eps_estimation_Beijing.csv`.
+    """
+    results_dir = main_dir / "DP_Audit" / mechanism_folders[mechanism] / "results"
+    suffix = mechanism_tags[mechanism] + ("_Beijing" if city == "beijing" else "") + tag
+    return results_dir / f"eps_estimation{suffix}.csv", results_dir / f"attack_results{suffix}.csv"
+
+
+def run_log_path(mechanism, city):
+    """
+    Path of the append-only run log of a (mechanism, city) audit, next to its result CSVs.
+    """
+    result_path, _ = result_paths(mechanism, city)
+    return result_path.with_name(result_path.name.replace("eps_estimation", "runlog")).with_suffix(".jsonl")
+
+
+def grr_probability(epsilon, m):
+    e_exp = math.exp(epsilon)
+    return e_exp / (e_exp + m - 1)
+
+
+def empirical_epsilon(mechanism, u_rero, m, kappa=None):
+    """
+    Inverts the RAD bound of `mechanism` (Corollary 5.3 for GRR and EM, Example 5.5 for SS/OUE) for one or many U-ReRo values.
+
+    `kappa` is the sum of the squared prior probabilities when the targets follow a non-uniform prior.
+    """
+    return invert_rad(mechanism, u_rero, m, kappa=kappa)
+
+
+def epsilon_interval(mechanism, hits, trials, m, alpha=1e-2, correction=None, kappa=None, interval="clopper-pearson", squares=None):
+    """
+    Empirical epsilon interval obtained by inverting the Clopper-Pearson (or Wilson) interval on ReRo.
+
+    `correction` is the attack baseline per report (1/m for the uniform prior, the
+    prior-weighted correction term otherwise) and is subtracted from both ends.
+    With Rao-Blackwellized scores, `hits` is the sum of the scores, `squares` the sum
+    of their squares, and an empirical Bernstein interval replaces the binomial one.
+
+    Returns:
+    -------
+    tuple
+        (eps_low, eps_high); eps_high is infinite while every report is a hit.
+    """
+    correction = 1/m if correction is None else correction
+    if squares is None:
+        rero_low, rero_high = INTERVALS[interval](hits, trials, alpha)
+    else:
+        rero_low, rero_high = empirical_bernstein(hits, squares, trials, alpha)
+    eps_low, eps_high = empirical_epsilon(mechanism, np.array([rero_low, rero_high]) - correction, m, kappa)
+    if rero_high >= 1:
+        eps_high = math.inf
+    return float(eps_low), float(eps_high)
+
+
+def report_size(mechanism, m, epsilon):
+    """
+    Number of node indices in one report: the subset size for SS, the expected number of 1-bits for OUE, 1 otherwise.
+    """
+    if mechanism == "SS":
+        return ss_parameters(m, epsilon)[0]
+    if mechanism == "OUE":
+        return math.ceil(1/2 + (m - 1) / (math.exp(epsilon) + 1))
+    return 1
+
+
+def report_chunks(mechanism, m, epsilon, J):
+    """
+    Splits the J reports of a target into chunks of at most about REPORT_CHUNK node indices.
+    """
+    chunk = max(1, REPORT_CHUNK // report_size(mechanism, m, epsilon))
+    return [min(chunk, J - start) for start in range(0, J, chunk)]
+
+
+def count_hits(mechanism, targets, m, epsilon, J, rng, mode="full", balls=None, cdf=None):
+    """
+    Runs J reports + attacks for each target node index and counts the successful reconstructions.
+
+    With eta-balls, a guess within eta of the target counts as a successful reconstruction.
+
+    Parameters:
+    ----------
+    mechanism : str
+        "GRR", "SS", "OUE" or "EM".
+    targets : array
+        Indices of the true nodes in [0, m-1].
+    m : int
+        Domain size.
+    epsilon : float
+        Privacy budget.
+    J : int
+        Number of reports per target.
+    rng : np.random.Generator
+        Random generator; the Numba samplers are seeded from it.
+    mode : str
+        "fused" runs the multithreaded mechanism + attack + count kernels, "full" simulates
+        every report batch from Python (reference), in chunks of at most REPORT_CHUNK node
+        indices, "sufficient" samples Binomial hit counts.
+    balls : tuple or None
+        (indptr, indices) CSR index of the eta-balls (see DP_Audit.distance); None for eta = 0.
+    cdf : np.ndarray or None
+        Per-source CDF table of the exponential mechanism (see DP_Audit.EM.em), required for "EM".
+
+    Returns:
+    -------
+    hits : np.ndarray
+        int64 number of hits for each target.
+    """
+    ball_indptr, ball_indices = identity_balls(m) if balls is None else balls
+    targets = np.asarray(targets, dtype=np.int32)
+
+    if mode == "sufficient":
+        ball_sizes = None if balls is None else ball_indptr[targets + 1] - ball_indptr[targets]
+        if mechanism == "GRR":
+            return grr_success_counts(m=m, p=grr_probability(epsilon, m), J=J, rng=rng, size=len(targets), ball_sizes=ball_sizes)
+        if mechanism == "SS":
+            return ss_success_counts(k=m, epsilon=epsilon, J=J, rng=rng, size=len(targets), ball_sizes=ball_sizes)
+        if mechanism == "EM":
+            return em_success_counts(cdf, targets, J, rng, ball_indptr, ball_indices)
+        raise ValueError(f"Mode 'sufficient' is not available for {mechanism}.")
+
+    if mode == "fused":
+        seeds = rng.integers(2**32, size=len(targets))
+        if mechanism == "GRR":
+            return grr_hit_counts(targets, m, grr_probability(epsilon, m), J, seeds, ball_indptr, ball_indices)
+        if mechanism == "SS":
+            return ss_hit_counts(targets, m, epsilon, J, seeds, ball_indptr, ball_indices)
+        if mechanism == "OUE":
+            return oue_hit_counts(targets, m, epsilon, J, seeds, ball_indptr, ball_indices)
+        if mechanism == "EM":
+            return em_hit_counts(targets, np.asarray(cdf), J, seeds, ball_indptr, ball_indices)
+        raise ValueError(f"Unsupported mechanism: {mechanism}")
+
+    in_ball = np.zeros(m, dtype=bool)
+    hits = np.zeros(len(targets), dtype=np.int64)
+    for i, target in enumerate(targets):
+        ball = ball_indices[ball_indptr[target]:ball_indptr[target + 1]]
+        in_ball[ball] = True
+        for size in report_chunks(mechanism, m, epsilon, J):
+            if mechanism == "GRR":
+                guesses = grr_mechanism_batch(true_idx=target, m=m, p=grr_probability(epsilon, m), size=size, rng=rng)
+            elif mechanism == "SS":
+                guesses = attack_ss_batch(ss_client_batch(target, m, epsilon, size, rng.integers(2**32)))
+            elif mechanism == "OUE":
+                indices, offsets = oue_client_sparse_batch(target, m, epsilon, size, rng.integers(2**32))
+                guesses = attack_ue_sparse(indices, offsets, m)
+            elif mechanism == "EM":
+                guesses = em_mechanism_batch(true_idx=target, cdf=cdf, size=size, rng=rng)
+            else:
+                raise ValueError(f"Unsupported mechanism: {mechanism}")
+            hits[i] += np.sum(in_ball[guesses])
+        in_ball[ball] = False
+    return hits
+
+
+def score_reports(mechanism, targets, m, epsilon, J, rng, mode="fused", balls=None, cdf=None):
+    """
+    Rao-Blackwellized counterpart of `count_hits`: each report is scored with the
+    probability that the attack's uniform pick hits, given the report.
+
+    The SS and OUE attacks pick a node at random out of the report, so their scores
+    have the mean of the hits at a much smaller variance. The GRR and EM attacks guess
+    the reported node: their hits are already the sufficient statistic and are returned
+    as such, without squares, so that they keep a binomial interval.
+
+    Returns:
+    -------
+    tuple
+        (scores, squares): float64 sums of the scores and of their squares for each
+        target, or (hits, None) for GRR and EM.
+    """
+    if mechanism in ("GRR", "EM"):
+        return count_hits(mechanism, targets, m, epsilon, J, rng, mode, balls, cdf), None
+    if mode == "sufficient":
+        raise ValueError("Rao-Blackwellized scores need the reports; use mode 'fused' or 'full'.")
+
+    ball_indptr, ball_indices = identity_balls(m) if balls is None else balls
+    targets = np.asarray(targets, dtype=np.int32)
+
+    if mode == "fused":
+        seeds = rng.integers(2**32, size=len(targets))
+        if mechanism == "SS":
+            return ss_score_sums(targets, m, epsilon, J, seeds, ball_indptr, ball_indices)
+        if mechanism == "OUE":
+            return oue_score_sums(targets, m, epsilon, J, seeds, ball_indptr, ball_indices)
+        raise ValueError(f"Unsupported mechanism: {mechanism}")
+
+    in_ball = np.zeros(m, dtype=bool)
+    scores = np.zeros(len(targets))
+    squares = np.zeros(len(targets))
+    for i, target in enumerate(targets):
+        ball = ball_indices[ball_indptr[target]:ball_indptr[target + 1]]
+        in_ball[ball] = True
+        for size in report_chunks(mechanism, m, epsilon, J):
+            if mechanism == "SS":
+                report_scores = np.mean(in_ball[ss_client_batch(target, m, epsilon, size, rng.integers(2**32))], axis=1)
+            elif mechanism == "OUE":
+                indices, offsets = oue_client_sparse_batch(target, m, epsilon, size, rng.integers(2**32))
+                nb_ones = np.diff(offsets)
+                inside = np.bincount(np.repeat(np.arange(size), nb_ones), weights=in_ball[indices], minlength=size)
+                report_scores = np.where(nb_ones > 0, inside / np.maximum(nb_ones, 1), len(ball) / m)
+            else:
+                raise ValueError(f"Unsupported mechanism: {mechanism}")
+            scores[i] += np.sum(report_scores)
+            squares[i] += np.sum(report_scores**2)
+        in_ball[ball] = False
+    return scores, squares
+
+
+def sweep_reports(mechanism, targets, m, epsilons, J, rng, balls=None, estimator="rao-blackwell"):
+    """
+    Mode "sweep": runs J reports + attacks per target once for a whole epsilon grid.
+
+    The randomness of every report is drawn once and shared by all grid points
+    (common random numbers), so the grid costs about as much as its smallest epsilon
+    and the estimates are coupled: they vary smoothly, and for GRR monotonically, with epsilon.
+    SS and OUE need the Rao-Blackwellized scores; EM is not supported.
+
+    Returns:
+    -------
+    tuple
+        (hits, squares): arrays of shape (len(targets), len(epsilons)), in the order of
+        `epsilons`, with the number of hits (or the summed scores) and the summed
+        squared scores (None when counting hits, always for GRR).
+    """
+    ball_indptr, ball_indices = identity_balls(m) if balls is None else balls
+    targets = np.asarray(targets, dtype=np.int32)
+    epsilons = np.asarray(epsilons, dtype=np.float64)
+    order = np.argsort(epsilons)
+    inverse = np.argsort(order)
+    seeds = rng.integers(2**32, size=len(targets))
+
+    if mechanism == "GRR":
+        ps = np.array([grr_probability(epsilon, m) for epsilon in epsilons[order]])
+        hits = grr_sweep_hit_counts(targets, m, ps, J, seeds, ball_indptr, ball_indices)[:, inverse]
+        return hits, None
+    if mechanism not in ("SS", "OUE"):
+        raise ValueError(f"Mode 'sweep' is not available for {mechanism}.")
+    if estimator != "rao-blackwell":
+        raise ValueError(f"Mode 'sweep' scores the {mechanism} reports; use the 'rao-blackwell' estimator.")
+
+    kernel = ss_sweep_score_sums if mechanism == "SS" else oue_sweep_score_sums
+    scores, squares = kernel(targets, m, epsilons[order], J, seeds, ball_indptr, ball_indices)
+    return scores[:, inverse], squares[:, inverse]
+
+
+def write_results(mechanism, city, epsilons, reros, u_reros, empirical_epsilons, empirical_epsilons_std, extra_columns=None, tag=""):
+    """
+    Writes the `eps_estimation*.csv` and `attack_results*.csv` files of a (mechanism, city) audit.
+
+    `extra_columns` maps additional column names of `eps_estimation*.csv` to one value per epsilon.
+    """
+    extra_columns = extra_columns or {}
+    result_path, attack_result_path = result_paths(mechanism, city, tag)
+    result_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(result_path, mode="w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["eps", "empirical_eps", "std"] + list(extra_columns))
+        for i, (eps, emp_eps, std) in enumerate(zip(epsilons, empirical_epsilons, empirical_epsilons_std)):
+            writer.writerow([eps, emp_eps, std] + [values[i] for values in extra_columns.values()])
+
+    with open(attack_result_path, mode="w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Epsilon", "ReRo", "U-ReRo"])
+        for eps, rero, u_rero, in zip(epsilons, reros, u_reros):
+            writer.writerow([eps, rero, u_rero])
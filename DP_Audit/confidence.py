@@ -0,0 +1,88 @@
+import numpy as np
+
+from scipy.stats import beta, norm
+
+
+def clopper_pearson(hits, trials, alpha=1e-2):
+    """
+    Exact two-sided (1 - alpha) Clopper-Pearson interval of a binomial proportion.
+
+    Parameters:
+    ----------
+    hits : int or array
+        Number of successes.
+    trials : int or array
+        Number of trials.
+    alpha : float
+        Significance level (default is 1e-2, as in LDPAuditor).
+
+    Returns:
+    -------
+    tuple
+        (low, high) bounds of the interval, with the shape of `hits`.
+    """
+    hits = np.asarray(hits, dtype=np.float64)
+    trials = np.asarray(trials, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        low = np.where(hits > 0, beta.ppf(alpha / 2, hits, trials - hits + 1), 0.0)
+        high = np.where(hits < trials, beta.ppf(1 - alpha / 2, hits + 1, trials - hits), 1.0)
+    return low, high
+
+
+def wilson(hits, trials, alpha=1e-2):
+    """
+    Two-sided (1 - alpha) Wilson score interval of a binomial proportion.
+
+    Close to the Clopper-Pearson interval at the sample sizes of the audits, but in
+    closed form and slightly narrower (it is not guaranteed to cover at 1 - alpha).
+
+    Returns:
+    -------
+    tuple
+        (low, high) bounds of the interval, with the shape of `hits`.
+    """
+    hits = np.asarray(hits, dtype=np.float64)
+    trials = np.asarray(trials, dtype=np.float64)
+    z2 = norm.ppf(1 - alpha / 2)**2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        center = (hits + z2 / 2) / (trials + z2)
+        half_width = np.sqrt(z2 * (hits * (trials - hits) / trials + z2 / 4)) / (trials + z2)
+    return np.clip(center - half_width, 0.0, 1.0), np.clip(center + half_width, 0.0, 1.0)
+
+
+INTERVALS = {"clopper-pearson": clopper_pearson, "wilson": wilson}
+
+
+def empirical_bernstein(total, squares, trials, alpha=1e-2):
+    """
+    Two-sided (1 - alpha) empirical Bernstein interval (Maurer and Pontil, 2009) of the
+    mean of i.i.d. scores in [0, 1], from the sums of the scores and of their squares
+    over `trials` reports.
+
+    Unlike a normal interval, it holds at any sample size and in the far tails, and it
+    keeps a positive width when all the scores are equal (e.g. all zero).
+
+    Returns:
+    -------
+    tuple
+        (low, high) bounds of the interval, clipped to [0, 1].
+    """
+    trials = np.asarray(trials, dtype=np.float64)
+    mean = np.asarray(total, dtype=np.float64) / trials
+    variance = np.maximum(np.asarray(squares, dtype=np.float64) / trials - mean**2, 0.0) * trials / np.maximum(trials - 1, 1)
+    # alpha / 2 on each side
+    log_term = np.log(4 / alpha)
+    half_width = np.sqrt(2 * variance * log_term / trials) + 7 * log_term / (3 * np.maximum(trials - 1, 1))
+    return np.clip(mean - half_width, 0.0, 1.0), np.clip(mean + half_width, 0.0, 1.0)
+
+
+def variance_reduction(total, squares, trials):
+    """
+    Variance of a Bernoulli hit with the mean of the scores over the variance of the scores.
+
+    This is the factor by which scoring the reports instead of counting the hits divides
+    the number of samples needed for a given interval width.
+    """
+    mean = total / trials
+    variance = squares / trials - mean**2
+    return mean * (1 - mean) / variance if variance > 0 else float("nan")
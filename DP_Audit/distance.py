@@ -0,0 +1,163 @@
+"""
+Distances between road-graph nodes for eta-approximate reconstruction.
+
+A guess is a hit when it lies within eta (meters) of the true node, either along the
+road network ("path": undirected shortest-path length) or as the crow flies ("haversine").
+The audits only need, for each true node, the eta-ball of nodes within eta, stored as a
+sorted CSR index. For graphs of a few thousand nodes it is read off a memory-mapped
+float32 all-pairs matrix cached next to the graph cache; larger graphs use
+distance-limited Dijkstra searches or a KD-tree instead.
+"""
+import numpy as np
+
+from functools import lru_cache
+from numba import jit
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+
+from DP_Audit.domain import graph_files
+from Porto.graph_cache import RoadGraphCache, cache_dir
+from Porto.trajectory_store import haversine, project
+
+METRICS = ["path", "haversine"]
+# largest graph for which the all-pairs matrix is materialized (float32: 256MB at 8000 nodes)
+MAX_DENSE_NODES = 8000
+BLOCK_SIZE = 256
+# entries of the dense (sources, m) rows returned by a block of distance-limited searches (float64: 128MB)
+SEARCH_BLOCK_ENTRIES = 1 << 24
+
+
+def adjacency_matrix(cache):
+    """
+    Sparse adjacency of the road graph weighted by the edge lengths in meters.
+    """
+    return csr_matrix((np.asarray(cache.lengths, dtype=np.float64), np.asarray(cache.indices), np.asarray(cache.indptr)),
+                      shape=(cache.m, cache.m))
+
+
+def distance_rows(cache, sources, metric="path", limit=np.inf):
+    """
+    float64 distances from the `sources` node indices to all nodes, one row per source.
+    """
+    if metric == "path":
+        return dijkstra(adjacency_matrix(cache), directed=False, indices=sources, limit=limit)
+    if metric == "haversine":
+        lat, lon = np.asarray(cache.lat), np.asarray(cache.lon)
+        return np.stack([haversine(lat, lon, (lat[source], lon[source])) for source in sources])
+    raise ValueError(f"Unsupported metric: {metric}. Choose one of {METRICS}.")
+
+
+def distance_matrix_path(graph_file, metric="path"):
+    cache = RoadGraphCache.for_graph_file(graph_file)
+    sha = cache.header.get("graph_sha256", "nosha")[:12]
+    return cache_dir(graph_file) / f"distances_{metric}_{sha}.npy"
+
+
+def load_distance_matrix(graph_file, metric="path"):
+    """
+    Memory-mapped float32 (m, m) matrix of node distances, computed and cached on first use.
+    """
+    path = distance_matrix_path(graph_file, metric)
+    if not path.exists():
+        cache = RoadGraphCache.for_graph_file(graph_file)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        matrix = np.lib.format.open_memmap(path.with_suffix(".tmp.npy"), mode="w+", dtype=np.float32, shape=(cache.m, cache.m))
+        for start in range(0, cache.m, BLOCK_SIZE):
+            sources = np.arange(start, min(start + BLOCK_SIZE, cache.m))
+            matrix[start:start + len(sources)] = distance_rows(cache, sources, metric)
+        matrix.flush()
+        del matrix
+        path.with_suffix(".tmp.npy").rename(path)
+    return np.load(path, mmap_mode="r")
+
+
+def ball_index(graph_file, eta, metric="path"):
+    """
+    CSR index of the eta-balls: the nodes within eta of node i are indices[indptr[i]:indptr[i+1]] (sorted, i included).
+
+    Returns:
+    -------
+    tuple
+        (indptr, indices) as int64 and int32 arrays.
+    """
+    cache = RoadGraphCache.for_graph_file(graph_file)
+    m = cache.m
+    if metric == "haversine" and m > MAX_DENSE_NODES:
+        # the projected distance is within a fraction of a meter of the haversine one at city scale
+        xy = project(np.asarray(cache.lat), np.asarray(cache.lon), (float(np.mean(cache.lat)), float(np.mean(cache.lon))))
+        balls = [np.sort(ball) for ball in cKDTree(xy).query_ball_point(xy, r=eta)]
+        lengths = np.array([len(ball) for ball in balls], dtype=np.int64)
+        indptr = np.zeros(m + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        return indptr, np.concatenate(balls).astype(np.int32)
+
+    if m <= MAX_DENSE_NODES:
+        matrix = load_distance_matrix(graph_file, metric)
+        block_size = BLOCK_SIZE
+    else:
+        # Dijkstra limited to eta; scipy still returns dense rows (inf beyond eta), so the
+        # blocks of sources shrink with m and only the finite entries of each row are kept
+        adjacency = adjacency_matrix(cache)
+        block_size = max(1, SEARCH_BLOCK_ENTRIES // m)
+    rows, cols = [], []
+    for start in range(0, m, block_size):
+        sources = np.arange(start, min(start + block_size, m))
+        if m <= MAX_DENSE_NODES:
+            block = matrix[sources]
+        else:
+            block = dijkstra(adjacency, directed=False, indices=sources, limit=eta)
+        block_rows, block_cols = np.nonzero(block <= eta)
+        rows.append(block_rows + start)
+        cols.append(block_cols)
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+
+    indptr = np.zeros(m + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=m), out=indptr[1:])
+    return indptr, cols.astype(np.int32)
+
+
+@lru_cache(maxsize=None)
+def city_balls(city, eta, metric="path"):
+    """
+    eta-ball index of a city's road graph, built once per process.
+    """
+    return ball_index(graph_files[city], eta, metric)
+
+
+@lru_cache(maxsize=None)
+def identity_balls(m):
+    """
+    eta = 0: every ball only holds its center.
+    """
+    return np.arange(m + 1, dtype=np.int64), np.arange(m, dtype=np.int32)
+
+
+@jit(nopython=True)
+def ball_mask(v, m, ball_indptr, ball_indices):
+    """
+    Membership mask of the eta-ball of node v for the fused kernels. It is empty when
+    the ball is {v} (eta = 0), so that exact reconstruction skips the O(m) buffer.
+    """
+    if ball_indptr[v + 1] - ball_indptr[v] == 1:
+        return np.zeros(0, dtype=np.bool_)
+    mask = np.zeros(m, dtype=np.bool_)
+    for j in range(ball_indptr[v], ball_indptr[v + 1]):
+        mask[ball_indices[j]] = True
+    return mask
+
+
+@jit(nopython=True)
+def is_in_ball(mask, v, u):
+    """
+    Whether node u lies in the eta-ball of node v, given its `ball_mask`.
+    """
+    return u == v if len(mask) == 0 else mask[u]
+
+
+def eta_kappa(indptr):
+    """
+    Success probability of a uniform guess under the uniform prior: the mean eta-ball size over m.
+    """
+    m = len(indptr) - 1
+    return float(np.mean(np.diff(indptr))) / m
@@ -0,0 +1,83 @@
+import numpy as np
+
+from functools import cached_property
+from pathlib import Path
+
+from Porto.graph_cache import RoadGraphCache
+
+# file imports
+main_dir = Path(__file__).parent.parent
+graph_files = {
+    "porto": main_dir / "Porto" / "data" / "porto_graph.pkl",
+    "beijing": main_dir / "Geolife" / "data" / "beijing_graph.pkl",
+}
+
+
+class GraphDomain:
+    """
+    Domain of the graph LDP mechanisms: the road-graph nodes and their indices in [0, m-1].
+
+    Attributes:
+    ----------
+    nodes : np.ndarray
+        int64 array of node IDs; the node with index i is nodes[i].
+    node_index : dict
+        Hash map from node ID to its index, built on first access.
+    m : int
+        Domain size (number of nodes).
+    graph : RoadGraphCache or None
+        Compact road graph (coordinates, adjacency) the domain was built from.
+    """
+
+    def __init__(self, nodes, graph=None):
+        self.nodes = np.asarray(nodes, dtype=np.int64)
+        self.m = len(self.nodes)
+        self.graph = graph
+
+    @cached_property
+    def node_index(self):
+        return {node: idx for idx, node in enumerate(self.nodes.tolist())}
+
+    @cached_property
+    def _order(self):
+        # argsort of the node IDs, for vectorized lookups without the hash map
+        return np.argsort(self.nodes, kind="stable")
+
+    @classmethod
+    def from_graph_file(cls, graph_file):
+        """
+        Builds the domain of a road graph (e.g. `Porto/data/porto_graph.pkl`) from its compact
+        cache, falling back to the pickle when the cache is missing.
+        """
+        graph = RoadGraphCache.for_graph_file(graph_file)
+        return cls(graph.nodes, graph)
+
+    @classmethod
+    def from_city(cls, city):
+        """
+        Builds the domain of the road graph of `city` ("porto" or "beijing").
+        """
+        if city not in graph_files:
+            raise ValueError(f"Unsupported city: {city}. Choose one of {list(graph_files)}.")
+        return cls.from_graph_file(graph_files[city])
+
+    def __len__(self):
+        return self.m
+
+    def index(self, node):
+        """
+        Index of a single node ID.
+        """
+        return self.node_index[int(node)]
+
+    def indices(self, nodes):
+        """
+        Indices of an iterable of node IDs, as an int64 array.
+        """
+        nodes = np.asarray(nodes if isinstance(nodes, np.ndarray) else list(nodes), dtype=np.int64)
+        sorted_nodes = self.nodes[self._order]
+        positions = np.minimum(np.searchsorted(sorted_nodes, nodes), self.m - 1)
+        missing = sorted_nodes[positions] != nodes
+        if np.any(missing):
+            raise KeyError(int(nodes[np.argmax(missing)]))
+        return self._order[positions]
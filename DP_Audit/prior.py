@@ -0,0 +1,143 @@
+"""
+Priors over the road-graph nodes for the graph audits.
+
+A prior is a float64 vector of length m aligned with the node order of GraphDomain
+(i.e. of the graph cache). Audit targets are drawn from it with a Walker/Vose alias
+table, and the baseline of the attack is the prior-weighted correction term of
+DPSGD_fullAux_nonUnif, E[prior(guess)], instead of 1/m.
+"""
+import hashlib
+import numpy as np
+
+from functools import lru_cache
+from pathlib import Path
+
+
+def uniform_prior(m):
+    return np.full(m, 1/m)
+
+
+def normalize_prior(weights, m):
+    """
+    Validates non-negative node weights of length m and normalizes them to a distribution.
+    """
+    prior = np.asarray(weights, dtype=np.float64).ravel()
+    if len(prior) != m:
+        raise ValueError(f"The prior has {len(prior)} entries but the graph has {m} nodes.")
+    if np.any(prior < 0) or not np.all(np.isfinite(prior)):
+        raise ValueError("The prior weights must be finite and non-negative.")
+    total = prior.sum()
+    if total <= 0:
+        raise ValueError("The prior weights sum to zero.")
+    return prior / total
+
+
+def load_prior(path, m):
+    """
+    Loads node weights from a .npy file or a one-column .csv/.txt file and normalizes them.
+    """
+    path = Path(path)
+    if path.suffix == ".npy":
+        weights = np.load(path)
+    else:
+        weights = np.loadtxt(path, delimiter=",", ndmin=1)
+    return normalize_prior(weights, m)
+
+
+def prior_hash(prior):
+    """
+    Short hash of a prior vector, used in the run-log configuration.
+    """
+    return hashlib.sha256(np.ascontiguousarray(prior, dtype=np.float64).tobytes()).hexdigest()[:16]
+
+
+def kappa(prior):
+    """
+    Probability that two independent draws from the prior coincide (1/m for the uniform prior).
+    """
+    return float(np.sum(prior**2))
+
+
+class AliasTable:
+    """
+    Walker/Vose alias table: O(m) setup, then O(1) per draw from a discrete distribution.
+
+    Attributes:
+    ----------
+    prob : np.ndarray
+        Probability of keeping the drawn column.
+    alias : np.ndarray
+        int64 column drawn instead.
+    """
+
+    def __init__(self, prior):
+        prior = np.asarray(prior, dtype=np.float64)
+        m = len(prior)
+        scaled = prior * m / prior.sum()
+        self.prob = np.ones(m)
+        self.alias = np.arange(m, dtype=np.int64)
+
+        small = [i for i in range(m) if scaled[i] < 1]
+        large = [i for i in range(m) if scaled[i] >= 1]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1 - scaled[s]
+            if scaled[l] < 1:
+                small.append(l)
+            else:
+                large.append(l)
+        # the leftovers are 1 up to rounding errors and keep prob = 1
+
+    def __len__(self):
+        return len(self.prob)
+
+    def sample(self, size, rng):
+        """
+        Draws `size` node indices with the given np.random.Generator.
+        """
+        columns = rng.integers(0, len(self.prob), size=size)
+        keep = rng.random(size) < self.prob[columns]
+        return np.where(keep, columns, self.alias[columns])
+
+
+@lru_cache(maxsize=None)
+def prior_sampler(path, m):
+    """
+    Prior and alias table of a prior file, loaded once per process.
+    """
+    prior = load_prior(path, m)
+    return prior, AliasTable(prior)
+
+
+def expected_correction(prior, targets, hits, J):
+    """
+    Prior-weighted correction term summed over the reports of each target.
+
+    The correction term of DPSGD_fullAux_nonUnif averages prior[guess] over the
+    reports. GRR, SS and OUE treat all the non-target nodes symmetrically, so a
+    missed guess is uniform over the m-1 other nodes and its expected prior
+    weight is (1 - prior[target]) / (m-1); the correction therefore follows
+    from the hit counts alone.
+
+    Parameters:
+    ----------
+    prior : np.ndarray
+        Prior over the m nodes.
+    targets : np.ndarray
+        Target node indices.
+    hits : np.ndarray
+        Number of hits of each target.
+    J : int
+        Number of reports per target.
+
+    Returns:
+    -------
+    np.ndarray
+        Expected sum of prior[guess] over the J reports of each target.
+    """
+    m = len(prior)
+    target_prior = prior[targets]
+    return hits * target_prior + (J - hits) * (1 - target_prior) / (m - 1)
@@ -0,0 +1,504 @@
+"""
+Single entry point for the graph DP audits (GRR, SS, OUE, EM on the Porto/Beijing road graphs).
+
+The (mechanism, epsilon, repetition, node-block) tasks are spread over a process pool.
+Each task draws from its own SeedSequence child of --seed, keyed by (mechanism, epsilon,
+repetition, block), so the results only depend on --seed and --block-size, not on the
+number of workers or on which other epsilons are in the grid.
+
+Every finished (epsilon, repetition) unit is appended to a run log next to the result
+CSVs. A restarted run skips the units already in the log and the CSVs are always
+rebuilt from it, so the epsilon grid can be widened without recomputing old points.
+
+With a fixed budget, the hit counts of the --repetitions runs of an epsilon are pooled
+into one estimate with a Clopper-Pearson (or Wilson) interval on ReRo, pushed through
+the RAD inversion into an empirical-epsilon interval.
+
+By default the SS and OUE reports are scored with the probability that the attack's
+random pick hits (Rao-Blackwellization over the attack's coin) instead of the hit itself,
+with an empirical Bernstein interval on the mean score; --estimator hits counts the hits.
+The GRR and EM attacks guess the report itself, so their hits are always counted.
+
+With --mode sweep, the randomness of every report is drawn once and shared by the whole
+epsilon grid (common random numbers): one pass costs about as much as one epsilon and
+the estimates are coupled across the grid, so the empirical-epsilon curves are smooth.
+
+With --tol, each epsilon is instead estimated sequentially: reports are drawn in rounds
+of doubling size until the Clopper-Pearson interval on ReRo, pushed through the RAD
+inversion, gives an empirical-epsilon interval narrower than --tol or --max-samples
+reports have been used.
+
+With --prior, the targets are drawn from a prior over the nodes instead of running
+through every node, and U-ReRo uses the prior-weighted correction term.
+
+With --targets, the audit runs through a uniform random subset of that many nodes
+instead of all m, with --samples / --targets reports each, so that city-scale graphs
+(10^5-10^6 nodes) keep enough reports per node. The subset only depends on --seed.
+
+With --eta, a guess within eta meters (road-network or haversine distance) of the true
+node is a successful reconstruction; the baseline becomes the mean eta-ball size over m.
+The same --metric is the utility distance of the exponential mechanism (EM).
+
+Usage:
+    python -m DP_Audit.run --city porto --mechanisms GRR SS OUE --workers 32
+    python -m DP_Audit.run --city beijing --mechanisms GRR --tol 0.05 --max-samples 10000000
+    python -m DP_Audit.run --city porto --prior Porto/data/porto_visit_counts.npy
+    python -m DP_Audit.run --city porto --eta 100 --metric path
+    python -m DP_Audit.run --city beijing --targets 1000 --samples 10000000
+"""
+import argparse
+import numba
+import numpy as np
+import os
+
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from pathlib import Path
+
+from DP_Audit.audit import MECHANISMS, EPSILONS, MC_SAMPLES, REPETITIONS, MODES, ESTIMATORS, count_hits, score_reports, sweep_reports, empirical_epsilon, epsilon_interval, write_results, run_log_path
+from DP_Audit.confidence import INTERVALS, variance_reduction
+from DP_Audit.distance import METRICS, city_balls, eta_kappa
+from DP_Audit.EM.em import city_em_cdf
+from DP_Audit.domain import GraphDomain
+from DP_Audit.prior import load_prior, prior_hash, prior_sampler, expected_correction, kappa
+from DP_Audit.runlog import RunLog, config_hash
+
+AuditTask = namedtuple("AuditTask", ["mechanism", "epsilon", "repetition", "start", "stop", "m", "J", "mode", "seed", "prior",
+                                     "city", "eta", "metric", "estimator", "targets"])
+
+
+def parse_epsilon(value):
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def unit_seed(seed, mechanism, epsilon, repetition, block):
+    """
+    Independent SeedSequence of one task, determined by the task itself rather than its position in the grid.
+    """
+    spawn_key = (MECHANISMS.index(mechanism), int(round(epsilon * 1e6)), repetition, block)
+    return np.random.SeedSequence(seed, spawn_key=spawn_key)
+
+
+@lru_cache(maxsize=None)
+def target_subset(m, size, seed):
+    """
+    Sorted int32 indices of a uniform random subset of `size` target nodes, shared by all the mechanisms and epsilons of a run.
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(len(MECHANISMS),)))
+    return np.sort(rng.choice(m, size=size, replace=False)).astype(np.int32)
+
+
+def make_tasks(units, m, J, block_size, mode, seed, prior=None, city=None, eta=0.0, metric="path", estimator="hits", nb_targets=None):
+    """
+    Splits (mechanism, epsilon, repetition) units into target-block tasks with independent seeds.
+
+    The targets are all the m nodes, or a uniform random subset of nb_targets nodes; the
+    start and stop of a task index into them. With a prior file, each task draws as many
+    targets from the prior as its block has entries.
+    With eta > 0, guesses within eta (in `metric`) of the target count as hits.
+    In sweep mode, a task runs all the epsilons of a (mechanism, repetition) at once and
+    its `epsilon` is the tuple of these epsilons.
+    """
+    if mode == "sweep":
+        grids = defaultdict(list)
+        for mechanism, epsilon, repetition in units:
+            grids[(mechanism, repetition)].append(epsilon)
+        units = [(mechanism, tuple(epsilons), repetition) for (mechanism, repetition), epsilons in grids.items()]
+
+    nb_targets = m if nb_targets is None else nb_targets
+    subset = None if prior is not None or nb_targets == m else target_subset(m, nb_targets, seed)
+
+    tasks = []
+    for mechanism, epsilon, repetition in units:
+        for block, start in enumerate(range(0, nb_targets, block_size)):
+            # a sweep draws one stream for the whole grid, keyed by epsilon 0
+            task_seed = unit_seed(seed, mechanism, 0 if mode == "sweep" else epsilon, repetition, block)
+            stop = min(start + block_size, nb_targets)
+            tasks.append(AuditTask(mechanism, epsilon, repetition, start, stop, m, J, mode, task_seed, prior,
+                                   city, eta, metric, estimator, None if subset is None else subset[start:stop]))
+    return tasks
+
+
+def run_task(task):
+    """
+    Runs one target-block task.
+
+    Returns:
+    -------
+    list
+        One (epsilon, hits, correction, squares) tuple per epsilon of the task: the number
+        of successful reconstructions over the block (the sum of the Rao-Blackwellized
+        scores with that estimator), the summed correction term when it differs from 1/m
+        per report (prior or eta > 0), and the sum of the squared scores (None when counting hits).
+    """
+    rng = np.random.default_rng(task.seed)
+    if task.prior is not None:
+        _, table = prior_sampler(task.prior, task.m)
+        targets = table.sample(task.stop - task.start, rng).astype(np.int32)
+    elif task.targets is not None:
+        targets = task.targets
+    else:
+        targets = np.arange(task.start, task.stop, dtype=np.int32)
+    balls = city_balls(task.city, task.eta, task.metric) if task.eta > 0 else None
+
+    if task.mode == "sweep":
+        hits, squares = sweep_reports(task.mechanism, targets, task.m, task.epsilon, task.J, rng, balls, task.estimator)
+        return [block_result(task, targets, balls, epsilon, hits[:, e], None if squares is None else squares[:, e])
+                for e, epsilon in enumerate(task.epsilon)]
+
+    cdf = city_em_cdf(task.city, task.epsilon, task.metric) if task.mechanism == "EM" else None
+    if task.estimator == "rao-blackwell":
+        hits, squares = score_reports(task.mechanism, targets, task.m, task.epsilon, task.J, rng, task.mode, balls, cdf)
+    else:
+        hits = count_hits(task.mechanism, targets, task.m, task.epsilon, task.J, rng, task.mode, balls, cdf)
+        squares = None
+    return [block_result(task, targets, balls, task.epsilon, hits, squares)]
+
+
+def block_result(task, targets, balls, epsilon, hits, squares):
+    """
+    (epsilon, hits, correction, squares) totals of a node block from the per-target hits (or scores).
+    """
+    correction = None
+    if task.prior is not None:
+        prior, _ = prior_sampler(task.prior, task.m)
+        correction = float(np.sum(expected_correction(prior, targets, hits, task.J)))
+    elif balls is not None:
+        # a uniform guess lands in the eta-ball of the target with probability |ball| / m
+        ball_sizes = balls[0][targets + 1] - balls[0][targets]
+        correction = float(np.sum(task.J * ball_sizes / task.m))
+    if squares is None:
+        return epsilon, int(np.sum(hits)), correction, None
+    return epsilon, float(np.sum(hits)), correction, float(np.sum(squares))
+
+
+def init_worker(threads):
+    # share the cores between the pool processes instead of every process starting one Numba thread per core
+    numba.set_num_threads(threads)
+
+
+def run_tasks(tasks, workers, on_result):
+    """
+    Runs the tasks serially or on a process pool and calls on_result(task, results) as they finish.
+    """
+    if workers == 1:
+        for task in tasks:
+            on_result(task, run_task(task))
+        return
+
+    threads = max(1, numba.config.NUMBA_NUM_THREADS // workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(threads,)) as executor:
+        futures = {executor.submit(run_task, task): task for task in tasks}
+        for future in as_completed(futures):
+            on_result(futures[future], future.result())
+
+
+def run_units(units, m, J, args, run_logs, config_hashes):
+    """
+    Runs (mechanism, epsilon, repetition) units with J reports per target and appends each finished unit to its run log.
+
+    In sweep mode, the whole epsilon grid of a (mechanism, repetition) is rerun as soon as one of its units is missing.
+    """
+    if args.mode == "sweep":
+        units = [(mechanism, epsilon, repetition)
+                 for mechanism, repetition in dict.fromkeys((mechanism, repetition) for mechanism, _, repetition in units)
+                 for epsilon in args.epsilons]
+    nb_targets = args.targets or m
+    tasks = make_tasks(units, m, J, args.block_size, args.mode, args.seed, args.prior, args.city, args.eta, args.metric,
+                       args.estimator, nb_targets)
+    nb_blocks = len(range(0, nb_targets, args.block_size))
+
+    # merge the partial results of the target blocks, in block order so that the float sums do not depend on the workers
+    partials = defaultdict(dict)
+
+    def on_result(task, results):
+        for epsilon, task_hits, task_correction, task_squares in results:
+            unit = (task.mechanism, epsilon, task.repetition)
+            partials[unit][task.start] = (task_hits, task_correction, task_squares)
+            if len(partials[unit]) < nb_blocks:
+                continue
+            unit_partials = partials.pop(unit)
+            blocks = [unit_partials[start] for start in range(0, nb_targets, args.block_size)]
+            record = {
+                "config": config_hashes[task.mechanism], "seed": args.seed,
+                "epsilon": epsilon, "repetition": task.repetition,
+                "hits": sum(block[0] for block in blocks), "trials": nb_targets * J,
+            }
+            if task_correction is not None:
+                record["correction"] = sum(block[1] for block in blocks)
+            if task_squares is not None:
+                record["squares"] = sum(block[2] for block in blocks)
+            run_logs[task.mechanism].append(record)
+
+    run_tasks(tasks, args.workers, on_result)
+
+
+def logged_units(run_log, config_hash):
+    return {(float(record["epsilon"]), record["repetition"]): record for record in run_log.records(config_hash)}
+
+
+def result_tag(args, mechanism):
+    """
+    Result-file tag of the audit variants (prior, eta, target subset, sequential budget,
+    sufficient or sweep mode), so they do not overwrite the canonical results of the paper figures.
+    """
+    tag = "" if args.prior is None else "_" + Path(args.prior).stem
+    if args.eta > 0:
+        tag += f"_eta{args.eta:g}_{args.metric}"
+    elif mechanism == "EM" and args.metric != "path":
+        tag += f"_{args.metric}"
+    if args.targets is not None:
+        tag += f"_targets{args.targets}"
+    if args.tol is not None:
+        tag += f"_tol{args.tol:g}"
+    if args.mode in ("sufficient", "sweep"):
+        tag += f"_{args.mode}"
+    return tag
+
+
+def record_correction(record, m):
+    """
+    Summed attack baseline of a logged unit: trials/m under the uniform prior.
+    """
+    return record.get("correction", record["trials"] / m)
+
+
+def pooled_totals(records, m):
+    """
+    Summed hits (or scores), trials, correction terms and squared scores (None when counting hits) of logged units.
+    """
+    squares = [record.get("squares") for record in records]
+    return (sum(record["hits"] for record in records), sum(record["trials"] for record in records),
+            sum(record_correction(record, m) for record in records), None if None in squares else sum(squares))
+
+
+def run_fixed(args, m, run_logs, config_hashes, kap=None):
+    """
+    Fixed budget: --repetitions independent runs of --samples reports per epsilon.
+
+    The empirical epsilon and its interval come from the hit counts (or scores) pooled
+    over the repetitions; `std` is the spread of the per-repetition estimates (NaN for
+    a single repetition, whose uncertainty is given by eps_low and eps_high).
+    """
+    J = int(args.samples / (args.targets or m))
+    completed = {mechanism: run_logs[mechanism].completed(config_hashes[mechanism]) for mechanism in args.mechanisms}
+    units = [(mechanism, epsilon, repetition)
+             for mechanism in args.mechanisms
+             for epsilon in args.epsilons
+             for repetition in range(args.repetitions)
+             if (float(epsilon), repetition) not in completed[mechanism]]
+    print(f"{len(units)} (mechanism, epsilon, repetition) units to run")
+    run_units(units, m, J, args, run_logs, config_hashes)
+
+    # derive the result CSVs from the run log
+    for mechanism in args.mechanisms:
+        logged = logged_units(run_logs[mechanism], config_hashes[mechanism])
+
+        reros, u_reros = [], []
+        empirical_epsilons, empirical_epsilons_std = [], []
+        samples, eps_lows, eps_highs, widths, reductions = [], [], [], [], []
+        for epsilon in args.epsilons:
+            records = [logged[(float(epsilon), rep)] for rep in range(args.repetitions)]
+            rep_reros = np.array([record["hits"] / record["trials"] for record in records])
+            rep_u_reros = rep_reros - np.array([record_correction(record, m) / record["trials"] for record in records])
+            results = empirical_epsilon(mechanism, rep_u_reros, m, kap)
+
+            hits, trials, correction, squares = pooled_totals(records, m)
+            eps_low, eps_high = epsilon_interval(mechanism, hits, trials, m, args.alpha, correction / trials, kap, args.interval, squares)
+
+            reros.append(hits / trials)
+            u_reros.append((hits - correction) / trials)
+            empirical_epsilons.append(empirical_epsilon(mechanism, u_reros[-1], m, kap))
+            # a single repetition has no spread: NaN rather than a misleading 0
+            empirical_epsilons_std.append(np.std(results) if args.repetitions > 1 else float("nan"))
+            samples.append(trials)
+            eps_lows.append(eps_low)
+            eps_highs.append(eps_high)
+            widths.append(eps_high - eps_low)
+            if squares is not None:
+                reductions.append(variance_reduction(hits, squares, trials))
+
+            print(f"{mechanism} Eps: {epsilon}, empirical eps: {empirical_epsilons[-1]}, interval: [{eps_low}, {eps_high}], std: {empirical_epsilons_std[-1]}"
+                  + (f", variance reduction: {reductions[-1]:.1f}x" if squares is not None and np.isfinite(reductions[-1]) else ""))
+
+        extra_columns = {"samples": samples, "eps_low": eps_lows, "eps_high": eps_highs, "ci_width": widths}
+        if reductions:
+            extra_columns["variance_reduction"] = reductions
+        write_results(mechanism, args.city, args.epsilons, reros, u_reros, empirical_epsilons, empirical_epsilons_std,
+                      extra_columns, tag=result_tag(args, mechanism))
+
+
+def round_reports(args, m, round_idx):
+    """
+    Reports per target in a sequential round; rounds double in size.
+    """
+    return max(1, int(args.round_samples * 2**round_idx / (args.targets or m)))
+
+
+def sequential_totals(logged, epsilon, nb_rounds, m):
+    return pooled_totals([logged[(float(epsilon), round_idx)] for round_idx in range(nb_rounds)], m)
+
+
+def run_sequential(args, m, run_logs, config_hashes, kap=None):
+    """
+    Adaptive budget: rounds of doubling size per epsilon until the empirical-epsilon interval is narrower than --tol.
+    The interval is re-checked after every round, so round r (from 0) uses level alpha / ((r+1)(r+2)): these sum
+    to alpha, and the reported interval holds at level --alpha whichever round the sampling stopped in.
+    """
+    active = [(mechanism, epsilon) for mechanism in args.mechanisms for epsilon in args.epsilons]
+    rounds_used = {}
+    round_idx = 0
+    while active:
+        completed = {mechanism: run_logs[mechanism].completed(config_hashes[mechanism]) for mechanism in args.mechanisms}
+        units = [(mechanism, epsilon, round_idx) for mechanism, epsilon in active
+                 if (float(epsilon), round_idx) not in completed[mechanism]]
+        run_units(units, m, round_reports(args, m, round_idx), args, run_logs, config_hashes)
+
+        logged = {mechanism: logged_units(run_logs[mechanism], config_hashes[mechanism]) for mechanism in args.mechanisms}
+        still_active = []
+        for mechanism, epsilon in active:
+            hits, trials, correction, squares = sequential_totals(logged[mechanism], epsilon, round_idx + 1, m)
+            level = args.alpha / ((round_idx + 1) * (round_idx + 2))
+            eps_low, eps_high = epsilon_interval(mechanism, hits, trials, m, level, correction / trials, kap, args.interval, squares)
+            if eps_high - eps_low < args.tol or trials >= args.max_samples:
+                rounds_used[(mechanism, epsilon)] = round_idx + 1
+            else:
+                still_active.append((mechanism, epsilon))
+        active = still_active
+        round_idx += 1
+
+    # derive the result CSVs from the run log
+    for mechanism in args.mechanisms:
+        logged = logged_units(run_logs[mechanism], config_hashes[mechanism])
+
+        reros, u_reros, empirical_epsilons = [], [], []
+        samples, eps_lows, eps_highs, widths, reductions = [], [], [], [], []
+        for epsilon in args.epsilons:
+            rounds = rounds_used[(mechanism, epsilon)]
+            hits, trials, correction, squares = sequential_totals(logged, epsilon, rounds, m)
+            level = args.alpha / (rounds * (rounds + 1))
+            eps_low, eps_high = epsilon_interval(mechanism, hits, trials, m, level, correction / trials, kap, args.interval, squares)
+            rero = hits / trials
+            u_rero = (hits - correction) / trials
+
+            reros.append(rero)
+            u_reros.append(u_rero)
+            empirical_epsilons.append(empirical_epsilon(mechanism, u_rero, m, kap))
+            samples.append(trials)
+            eps_lows.append(eps_low)
+            eps_highs.append(eps_high)
+            widths.append(eps_high - eps_low)
+            if squares is not None:
+                reductions.append(variance_reduction(hits, squares, trials))
+
+            print(f"{mechanism} Eps: {epsilon}, empirical eps: {empirical_epsilons[-1]}, interval: [{eps_low}, {eps_high}], samples: {trials}"
+                  + (f", variance reduction: {reductions[-1]:.1f}x" if squares is not None and np.isfinite(reductions[-1]) else ""))
+
+        extra_columns = {"samples": samples, "eps_low": eps_lows, "eps_high": eps_highs, "ci_width": widths}
+        if reductions:
+            extra_columns["variance_reduction"] = reductions
+        write_results(mechanism, args.city, args.epsilons, reros, u_reros, empirical_epsilons,
+                      [float("nan")] * len(args.epsilons), extra_columns, tag=result_tag(args, mechanism))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Empirical epsilon of graph LDP mechanisms via U-ReRo.")
+    parser.add_argument("--city", choices=["porto", "beijing"], required=True)
+    parser.add_argument("--mechanisms", nargs="+", choices=MECHANISMS, default=MECHANISMS)
+    parser.add_argument("--epsilons", nargs="+", type=parse_epsilon, default=list(EPSILONS))
+    parser.add_argument("--samples", type=int, default=MC_SAMPLES, help="Monte Carlo samples per repetition")
+    parser.add_argument("--repetitions", type=int, default=REPETITIONS,
+                        help="independent runs per epsilon; their hit counts are pooled for the estimate and its interval")
+    parser.add_argument("--mode", choices=MODES, default="fused",
+                        help="fused: multithreaded Numba kernels, full: simulate every report batch from Python (reference), "
+                             "sufficient: sample Binomial hit counts per node, sweep: one pass with common random numbers "
+                             "over all the epsilons (GRR, SS, OUE)")
+    parser.add_argument("--estimator", choices=ESTIMATORS, default=None,
+                        help="hits: count the successful attacks, rao-blackwell: score each report with the probability that the "
+                             "attack hits (same mean, much smaller variance for SS and OUE); default: rao-blackwell, hits with --mode=sufficient")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--block-size", type=int, default=256, help="number of target nodes per task")
+    parser.add_argument("--targets", type=int, default=None,
+                        help="audit a uniform random subset of this many target nodes (all nodes by default), for large graphs")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--prior", default=None,
+                        help="node weights (.npy or .csv, in graph-cache node order) to draw the targets from; uniform over all nodes by default")
+    parser.add_argument("--eta", type=float, default=0.0, help="guesses within eta meters of the true node count as hits")
+    parser.add_argument("--metric", choices=METRICS, default="path", help="distance used with --eta and by EM")
+
+    # sequential estimation and intervals
+    parser.add_argument("--tol", type=float, default=None,
+                        help="stop sampling an epsilon once its empirical-epsilon interval is narrower than tol")
+    parser.add_argument("--max-samples", type=int, default=100 * MC_SAMPLES, help="budget cap per epsilon with --tol")
+    parser.add_argument("--round-samples", type=int, default=MC_SAMPLES // 10, help="samples of the first round with --tol")
+    parser.add_argument("--alpha", type=float, default=1e-2, help="significance level of the ReRo intervals (split over the rounds with --tol)")
+    parser.add_argument("--interval", choices=list(INTERVALS), default="clopper-pearson", help="binomial interval on the pooled hit counts")
+    args = parser.parse_args(argv)
+
+    if args.estimator is None:
+        args.estimator = "hits" if args.mode == "sufficient" else "rao-blackwell"
+    if args.estimator == "rao-blackwell" and args.mode == "sufficient":
+        parser.error("--estimator rao-blackwell needs the reports; use --mode fused, full or sweep")
+    if args.mode == "sweep" and "EM" in args.mechanisms:
+        parser.error("--mode sweep is not available for EM")
+    if args.mode == "sweep" and args.estimator == "hits" and set(args.mechanisms) & {"SS", "OUE"}:
+        parser.error("--mode sweep scores the SS and OUE reports; use --estimator rao-blackwell")
+
+    domain = GraphDomain.from_city(args.city)
+    m = domain.m
+    if args.targets is not None and not 1 <= args.targets <= m:
+        parser.error(f"--targets must be between 1 and the number of nodes ({m})")
+    if args.tol is None and args.samples < (args.targets or m):
+        parser.error(f"--samples must be at least the number of targets ({args.targets or m}); audit fewer nodes with --targets")
+
+    kap = None
+    if args.prior is not None and args.eta > 0:
+        parser.error("--eta is only supported under the uniform prior")
+    if "EM" in args.mechanisms and (args.prior is not None or args.eta > 0):
+        # the correction terms and the kappa rescaling assume that a missed guess is uniform over the other nodes
+        parser.error("--prior and --eta assume a mechanism symmetric in the non-target nodes, which EM is not")
+    if args.eta > 0:
+        kap = eta_kappa(city_balls(args.city, args.eta, args.metric)[0])
+        print(f"eta = {args.eta:g} m ({args.metric}): kappa = {kap:.3e} (eta = 0: {1/m:.3e})")
+    if args.prior is not None:
+        prior = load_prior(args.prior, m)
+        kap = kappa(prior)
+        print(f"Prior {args.prior}: kappa = {kap:.3e} (uniform: {1/m:.3e})")
+
+    # run logs of the finished units, one per mechanism; tol and max-samples do not change
+    # the content of the rounds, so a sequential run can be resumed with a tighter tolerance
+    run_logs, config_hashes = {}, {}
+    for mechanism in args.mechanisms:
+        config = {"mechanism": mechanism, "city": args.city, "m": m, "mode": args.mode,
+                  "block_size": args.block_size, "seed": args.seed}
+        if args.prior is not None:
+            config["prior"] = prior_hash(prior)
+        if args.eta > 0:
+            config["eta"] = args.eta
+        if args.estimator != "hits" and mechanism in ("SS", "OUE"):
+            # GRR and EM count their hits with either estimator
+            config["estimator"] = args.estimator
+        if args.mode == "sweep":
+            # the draws of a sweep depend on the whole grid
+            config["epsilons"] = sorted(float(epsilon) for epsilon in args.epsilons)
+        if args.eta > 0 or mechanism == "EM":
+            config["metric"] = args.metric
+        if args.targets is not None:
+            config["targets"] = args.targets
+        if args.tol is None:
+            config["J"] = int(args.samples / (args.targets or m))
+        else:
+            config["round_samples"] = args.round_samples
+        run_logs[mechanism] = RunLog(run_log_path(mechanism, args.city))
+        config_hashes[mechanism] = config_hash(config)
+
+    if args.tol is None:
+        run_fixed(args, m, run_logs, config_hashes, kap)
+    else:
+        run_sequential(args, m, run_logs, config_hashes, kap)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import hashlib
+import json
+import os
+
+from pathlib import Path
+
+
+def config_hash(config):
+    """
+    Short, stable hash of an audit configuration (a JSON-serializable dict).
+    """
+    payload = json.dumps(config, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+class RunLog:
+    """
+    Append-only JSONL log of finished audit units.
+
+    Every line records the success counts of one finished (epsilon, repetition) unit
+    together with the hash of the configuration and the seed that produced it, so an
+    interrupted sweep can be resumed and the result CSVs can be rebuilt from the log.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def records(self, config_hash=None):
+        """
+        Returns the logged records, optionally only those of one configuration.
+        """
+        if not self.path.exists():
+            return []
+
+        records = []
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # a line cut short by a crash while writing
+                    continue
+                if config_hash is None or record["config"] == config_hash:
+                    records.append(record)
+        return records
+
+    def completed(self, config_hash):
+        """
+        Set of (epsilon, repetition) units already finished for a configuration.
+        """
+        return {(float(record["epsilon"]), record["repetition"]) for record in self.records(config_hash)}
+
+    def append(self, record):
+        """
+        Appends one record and flushes it to disk.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
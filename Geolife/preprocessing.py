@@ -1,12 +1,17 @@
+import argparse
 import json
+import numpy as np
 import os
+import pandas as pd
 import pickle
 
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 from Geolife.constants import BEIJING_CENTERPOINT, BEIJING_RADIUS
+from Porto.graph_cache import RoadGraphCache, cache_dir
 from Porto.roadgraph import roadgraph
+from Porto.trajectory_store import TrajectoryStore, lengths_to_offsets
 
 
 # file imports
@@ -14,40 +19,102 @@ current_dir = Path(__file__).parent.parent
 geolife_constants_file = current_dir / "Geolife" / "constants.py"
 geolife_directory = current_dir / "Geolife" / "Data"
 processed_geolife_data = current_dir / "Geolife" / "data" / "geolife_trajectories.json"
+geolife_store = current_dir / "Geolife" / "data" / "geolife_store"
 graph_pkl = current_dir / "Geolife" / "data" / "beijing_graph.pkl"
 
 
+# days between the .plt day origin (1899-12-30) and the Unix epoch
+UNIX_EPOCH_DAYS = 25569
+
+
 ### FUNCIONES ###
 
+def read_plt(file_path):
+    """
+    Reads a Geolife .plt file with a vectorized CSV parser.
+
+    The timestamps are computed from the numeric day column (days since 1899-12-30, GMT).
+
+    Returns:
+    -------
+    tuple
+        (lat, lon, ts) arrays; lat/lon in float64, ts in int64 Unix seconds.
+    """
+    # omitting the first 6 lines (metadata)
+    try:
+        points = pd.read_csv(file_path, skiprows=6, header=None, usecols=[0, 1, 4], names=["lat", "lon", "days"],
+                             dtype={"lat": np.float64, "lon": np.float64, "days": np.float64})
+    except pd.errors.EmptyDataError:
+        return np.empty(0), np.empty(0), np.empty(0, dtype=np.int64)
+    ts = np.rint((points["days"].to_numpy() - UNIX_EPOCH_DAYS) * 86400).astype(np.int64)
+    return points["lat"].to_numpy(), points["lon"].to_numpy(), ts
+
 # Función para leer una trayectoria desde un archivo Geolife .plt
 def read_trajectory(file_path):
-    trajectory = []
-
-    # Leer las líneas del archivo, omitiendo las primeras 6 (metadata)
-    with open(file_path, 'r') as f:
-        lines = f.readlines()[6:]
-        for line in lines:
-            parts = line.strip().split(',')
-            lat = float(parts[0])
-            lon = float(parts[1])
-            time_str = parts[5] + ' ' + parts[6]  # Fecha y hora
-            time = datetime.strptime(time_str, "%Y-%m-%d %H:%M:%S")
-            unix_timestamp = int(time.timestamp())
-            trajectory.append((lat, lon, unix_timestamp))
-
-    return trajectory
+    lat, lon, ts = read_plt(file_path)
+    return list(zip(lat.tolist(), lon.tolist(), ts.tolist()))
+
+def plt_files(directory):
+    """
+    .plt files of a user (or of the whole archive) in a fixed order.
+    """
+    return sorted(Path(directory).rglob("*.plt"))
 
 # Función para obtener todas las trayectorias desde archivos .plt
 def get_all_trajectories(directory):
     all_trajectories = []
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.endswith(".plt"):
-                trajectory = read_trajectory(os.path.join(root, file))
-                if len(trajectory) > 0:  # Asegúrate de que la trayectoria no esté vacía
-                    all_trajectories.append(trajectory)
+    for file in plt_files(directory):
+        trajectory = read_trajectory(file)
+        if len(trajectory) > 0:  # Asegúrate de que la trayectoria no esté vacía
+            all_trajectories.append(trajectory)
     return all_trajectories
 
+def read_user(user_dir):
+    """
+    Reads all the (non-empty) trajectories of one user directory into a TrajectoryStore.
+    """
+    trajectories = [read_plt(file) for file in plt_files(user_dir)]
+    trajectories = [trajectory for trajectory in trajectories if len(trajectory[0]) > 0]
+    lengths = np.array([len(trajectory[0]) for trajectory in trajectories], dtype=np.int64)
+    if trajectories:
+        lat, lon, ts = (np.concatenate(column) for column in zip(*trajectories))
+    else:
+        lat, lon, ts = np.empty(0), np.empty(0), np.empty(0, dtype=np.int64)
+
+    columns = {
+        "USER": np.full(len(lengths), int(Path(user_dir).name), dtype=np.int32),
+        "TIMESTAMP": np.array([trajectory[2][0] for trajectory in trajectories], dtype=np.int64),
+    }
+    return TrajectoryStore(np.column_stack((lat, lon)).astype(np.float32), lengths_to_offsets(lengths), columns, {"ts": ts})
+
+def ingest_geolife(directory=geolife_directory, output_dir=geolife_store, workers=None):
+    """
+    Reads the Geolife archive on a process pool (one task per user) and writes one TrajectoryStore.
+
+    Besides the float32 (lat, lon) points and the trajectory offsets, the store holds the
+    int64 Unix timestamp `ts` of every point and, per trajectory, its `USER` and its start
+    `TIMESTAMP`.
+    """
+    user_dirs = sorted(path for path in Path(directory).iterdir() if path.is_dir())
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        store = TrajectoryStore.concatenate(executor.map(read_user, user_dirs))
+    store.save(output_dir)
+    return store
+
+def load_geolife_store(directory=geolife_store, mmap_mode="r"):
+    """
+    Loads the TrajectoryStore written by `ingest_geolife`, memory-mapped by default.
+    """
+    return TrajectoryStore.load(directory, mmap_mode=mmap_mode)
+
+def store_to_trajectories(store):
+    """
+    Trajectories of a store as lists of (lat, lon, ts) tuples, the format of `get_all_trajectories`.
+    """
+    lat, lon = (np.asarray(store.points[:, col], dtype=np.float64).tolist() for col in range(2))
+    ts = store.point_columns["ts"].tolist()
+    return [list(zip(lat[start:stop], lon[start:stop], ts[start:stop])) for start, stop in zip(store.offsets[:-1], store.offsets[1:])]
+
 def process_trajectory(trajectory):
     times = []
     latitudes = []
@@ -94,21 +161,30 @@ def load_trajectories_from_json(file):
 
 
 if __name__ == "__main__":
-    # extract all trajectories from Geolife archive
-    all_trajectories = get_all_trajectories(geolife_directory)
+    parser = argparse.ArgumentParser(description="Geolife ingestion and Beijing road graph extraction.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--json", action="store_true", help="also export the trajectories to the (large) JSON file")
+    parser.add_argument("--osm-file", default=None, help="local .osm/.osm.pbf extract to build the road graph offline")
+    args = parser.parse_args()
 
-    # save processed trajectories to JSON
-    save_trajectories_to_json(all_trajectories, processed_geolife_data)
+    # extract all trajectories from Geolife archive into the columnar store
+    store = ingest_geolife(geolife_directory, geolife_store, args.workers)
+    print(f"{len(store)} trajectories, {len(store.points)} points -> {geolife_store}")
 
-    trajectories = load_trajectories_from_json(processed_geolife_data)
+    # optional JSON export of the processed trajectories
+    if args.json:
+        save_trajectories_to_json(store_to_trajectories(load_geolife_store()), processed_geolife_data)
 
     # create roadgraph
-    (_, G, _) = roadgraph(BEIJING_CENTERPOINT, BEIJING_RADIUS)
+    (_, G, _) = roadgraph(BEIJING_CENTERPOINT, BEIJING_RADIUS, osm_file=args.osm_file)
     node_list = list(G.nodes())
 
     with open(graph_pkl, 'wb') as f:
         pickle.dump(G, f)
 
+    # compact node/adjacency cache used by the audits
+    RoadGraphCache.from_graph(G).save(cache_dir(graph_pkl), graph_pkl)
+
     with open(geolife_constants_file, 'a') as f:
         f.write(f'\nM = {len(node_list)}\n')
 
@@ -0,0 +1,166 @@
+# Compact cache of an OSMnx road graph: node IDs, lat/lon and CSR adjacency as memory-mappable .npy files.
+# Loading it only needs numpy, so the audits do not have to import networkx and unpickle the graph.
+import hashlib
+import json
+import numpy as np
+import pickle
+
+from functools import lru_cache
+from pathlib import Path
+
+CACHE_VERSION = 1
+ARRAYS = ["nodes", "lat", "lon", "indptr", "indices", "lengths"]
+
+
+def cache_dir(graph_file):
+    """
+    Cache directory next to a graph pickle, e.g. `Porto/data/porto_graph_cache/`.
+    """
+    graph_file = Path(graph_file)
+    return graph_file.with_name(graph_file.stem + "_cache")
+
+
+def file_sha256(path, block_size=1 << 24):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _stat_sha256(path, mtime_ns, size):
+    return file_sha256(path)
+
+
+def graph_sha256(graph_file):
+    """
+    SHA-256 of a graph pickle, hashed once per process as long as its mtime and size are unchanged.
+    """
+    path = Path(graph_file).resolve()
+    stat = path.stat()
+    return _stat_sha256(path, stat.st_mtime_ns, stat.st_size)
+
+
+class RoadGraphCache:
+    """
+    Road graph as flat arrays.
+
+    Attributes:
+    ----------
+    nodes : np.ndarray
+        int64 OSM node IDs; node i of the cache is nodes[i].
+    lat, lon : np.ndarray
+        float64 coordinates of the nodes.
+    indptr, indices, lengths : np.ndarray
+        CSR adjacency of the directed graph: the successors of node i are
+        indices[indptr[i]:indptr[i+1]] (int32) with edge lengths in meters (float32,
+        shortest of the parallel edges).
+    """
+
+    def __init__(self, nodes, lat, lon, indptr, indices, lengths, header=None):
+        self.nodes = nodes
+        self.lat = lat
+        self.lon = lon
+        self.indptr = indptr
+        self.indices = indices
+        self.lengths = lengths
+        self.header = header or {}
+
+    @property
+    def m(self):
+        return len(self.nodes)
+
+    @classmethod
+    def from_graph(cls, G):
+        """
+        Flattens a networkx (Multi)DiGraph with OSMnx node attributes 'y'/'x' and edge attribute 'length'.
+        """
+        nodes = np.fromiter(G.nodes(), dtype=np.int64, count=G.number_of_nodes())
+        node_index = {node: idx for idx, node in enumerate(nodes.tolist())}
+        lat = np.array([G.nodes[node]['y'] for node in nodes.tolist()], dtype=np.float64)
+        lon = np.array([G.nodes[node]['x'] for node in nodes.tolist()], dtype=np.float64)
+
+        edges = np.array([(node_index[u], node_index[v], length) for u, v, length in G.edges(data="length", default=np.nan)],
+                         dtype=np.float64).reshape(-1, 3)
+        src = edges[:, 0].astype(np.int64)
+        dst = edges[:, 1].astype(np.int64)
+        lengths = edges[:, 2]
+
+        # keep the shortest of parallel edges, sorted by (source, target)
+        order = np.lexsort((lengths, dst, src))
+        src, dst, lengths = src[order], dst[order], lengths[order]
+        first = np.ones(len(src), dtype=bool)
+        first[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+        src, dst, lengths = src[first], dst[first], lengths[first]
+
+        indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(nodes)), out=indptr[1:])
+        return cls(nodes, lat, lon, indptr, dst.astype(np.int32), lengths.astype(np.float32))
+
+    def save(self, directory, graph_file=None):
+        """
+        Writes one .npy file per array and a small JSON header.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in ARRAYS:
+            np.save(directory / f"{name}.npy", getattr(self, name))
+
+        self.header = {
+            "version": CACHE_VERSION,
+            "m": self.m,
+            "nb_edges": int(len(self.indices)),
+            "arrays": ARRAYS,
+        }
+        if graph_file is not None:
+            self.header["graph_file"] = Path(graph_file).name
+            self.header["graph_sha256"] = graph_sha256(graph_file)
+        with open(directory / "header.json", "w") as f:
+            json.dump(self.header, f, indent=4)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        """
+        Loads a cache written by `save`, memory-mapping the arrays by default.
+        """
+        directory = Path(directory)
+        with open(directory / "header.json", "r") as f:
+            header = json.load(f)
+        if header.get("version") != CACHE_VERSION:
+            raise ValueError(f"Unsupported graph cache version in {directory}: {header.get('version')}")
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode=mmap_mode) for name in ARRAYS}
+        return cls(header=header, **arrays)
+
+    @classmethod
+    def for_graph_file(cls, graph_file, mmap_mode="r"):
+        """
+        Loads the cache of a graph pickle, building it from the pickle when it is missing or outdated.
+        """
+        graph_file = Path(graph_file)
+        directory = cache_dir(graph_file)
+        if (directory / "header.json").exists():
+            cache = cls.load(directory, mmap_mode=mmap_mode)
+            if cache.header.get("graph_sha256") == graph_sha256(graph_file):
+                return cache
+
+        # fall back to the pickle and (re)build the cache
+        with open(graph_file, 'rb') as f:
+            G = pickle.load(f)
+        cache = cls.from_graph(G)
+        try:
+            cache.save(directory, graph_file)
+        except OSError:
+            pass
+        return cache
+
+
+if __name__ == "__main__":
+    # Build the caches of the Porto and Beijing road graphs
+    main_dir = Path(__file__).parent.parent
+    for graph_file in [main_dir / "Porto" / "data" / "porto_graph.pkl", main_dir / "Geolife" / "data" / "beijing_graph.pkl"]:
+        with open(graph_file, 'rb') as f:
+            G = pickle.load(f)
+        cache = RoadGraphCache.from_graph(G)
+        cache.save(cache_dir(graph_file), graph_file)
+        print(f"{graph_file.name}: {cache.m} nodes, {len(cache.indices)} edges -> {cache_dir(graph_file)}")
@@ -0,0 +1,221 @@
+# Batch map-matching of GPS trajectories (a TrajectoryStore) to sequences of road-graph node indices
+# (graph-cache node order), the domain of the LDP mechanisms in DP_Audit.
+import argparse
+import json
+import numpy as np
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from scipy.spatial import cKDTree
+
+from Porto.graph_cache import RoadGraphCache
+from Porto.trajectory_store import TrajectoryStore, project, lengths_to_offsets
+
+## file imports
+main_dir = Path(__file__).parent.parent
+city_files = {
+    "porto": (main_dir / "Porto" / "data" / "porto_store", main_dir / "Porto" / "data" / "porto_graph.pkl",
+              main_dir / "Porto" / "data" / "porto_matched"),
+    "beijing": (main_dir / "Geolife" / "data" / "geolife_store", main_dir / "Geolife" / "data" / "beijing_graph.pkl",
+                main_dir / "Geolife" / "data" / "geolife_matched"),
+}
+
+MATCHED_VERSION = 1
+
+# per-process state of the workers
+_matcher = None
+_store = None
+
+
+class NodeSequences:
+    """
+    Map-matched trajectories as ragged arrays: the int32 node indices of trajectory i are
+    nodes[offsets[i]:offsets[i+1]].
+    """
+
+    def __init__(self, nodes, offsets, header=None):
+        self.nodes = nodes
+        self.offsets = offsets
+        self.header = header or {}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.nodes[self.offsets[i]:self.offsets[i + 1]]
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def save(self, directory, **header):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / "nodes.npy", self.nodes)
+        np.save(directory / "offsets.npy", self.offsets)
+        self.header = {"version": MATCHED_VERSION, "nb_trajectories": len(self), "nb_nodes": int(len(self.nodes)), **header}
+        with open(directory / "header.json", "w") as f:
+            json.dump(self.header, f, indent=4)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        directory = Path(directory)
+        with open(directory / "header.json", "r") as f:
+            header = json.load(f)
+        if header.get("version") != MATCHED_VERSION:
+            raise ValueError(f"Unsupported matched trajectories version in {directory}: {header.get('version')}")
+        return cls(np.load(directory / "nodes.npy", mmap_mode=mmap_mode), np.load(directory / "offsets.npy", mmap_mode=mmap_mode), header)
+
+
+def neighbor_table(cache):
+    """
+    Padded (m, max_degree) table of the neighbours of every node in the undirected road graph, -1 as padding.
+    """
+    m = cache.m
+    src = np.repeat(np.arange(m), np.diff(cache.indptr))
+    dst = np.asarray(cache.indices, dtype=np.int64)
+    pairs = np.unique(np.concatenate((src * m + dst, dst * m + src)))
+    u, v = pairs // m, pairs % m
+    u, v = u[u != v], v[u != v]
+
+    degree = np.bincount(u, minlength=m)
+    table = np.full((m, max(1, degree.max(initial=0))), -1, dtype=np.int32)
+    table[u, np.arange(len(u)) - lengths_to_offsets(degree)[u]] = v
+    return table
+
+
+class MapMatcher:
+    """
+    Snaps GPS points to road-graph nodes.
+
+    The k nearest nodes of a point (KD-tree over the projected node coordinates) and the
+    edges incident to them are the candidates. The point is projected on every candidate
+    edge and snapped to the end of the closest edge that is nearest to its projection.
+    """
+
+    def __init__(self, cache, k=8, max_distance=50.0, batch_size=1 << 14):
+        self.center = (float(np.mean(cache.lat)), float(np.mean(cache.lon)))
+        self.xy = project(np.asarray(cache.lat), np.asarray(cache.lon), self.center)
+        self.tree = cKDTree(self.xy)
+        self.neighbors = neighbor_table(cache)
+        self.k = min(k, cache.m)
+        self.max_distance = max_distance
+        self.batch_size = batch_size
+
+    def match_points(self, lat, lon):
+        """
+        int32 node index of each point, -1 for points farther than max_distance from every candidate edge.
+        """
+        matched = np.empty(len(lat), dtype=np.int32)
+        for start in range(0, len(lat), self.batch_size):
+            stop = start + self.batch_size
+            matched[start:stop] = self._match_batch(project(np.asarray(lat[start:stop], dtype=np.float64),
+                                                            np.asarray(lon[start:stop], dtype=np.float64), self.center))
+        return matched
+
+    def _match_batch(self, p):
+        _, candidates = self.tree.query(p, k=self.k)
+        candidates = candidates.reshape(len(p), -1)
+
+        # candidate segments (u, v): shape (points, k, max_degree)
+        u = np.broadcast_to(candidates[:, :, None], candidates.shape + (self.neighbors.shape[1],))
+        v = self.neighbors[candidates]
+        # padding entries become degenerate segments (u, u), i.e. the candidate node itself
+        v = np.where(v >= 0, v, u)
+
+        a, b = self.xy[u], self.xy[v]
+        ab = b - a
+        ap = p[:, None, None, :] - a
+        length2 = np.sum(ab**2, axis=-1)
+        t = np.clip(np.sum(ap * ab, axis=-1) / np.where(length2 > 0, length2, 1), 0, 1)
+        distance2 = np.sum((ap - t[..., None] * ab)**2, axis=-1)
+
+        flat = distance2.reshape(len(p), -1)
+        best = np.argmin(flat, axis=1)
+        rows = np.arange(len(p))
+        nodes = np.where(t.reshape(len(p), -1)[rows, best] <= 0.5, u.reshape(len(p), -1)[rows, best], v.reshape(len(p), -1)[rows, best])
+        return np.where(flat[rows, best] <= self.max_distance**2, nodes, -1).astype(np.int32)
+
+    def match(self, points, lengths, collapse=True):
+        """
+        Node sequences of consecutive trajectories.
+
+        Parameters:
+        ----------
+        points : np.ndarray
+            (nb_points, 2) (lat, lon) points of the trajectories, one after the other.
+        lengths : np.ndarray
+            Number of points of each trajectory.
+        collapse : bool
+            Merge consecutive points snapped to the same node.
+
+        Returns:
+        -------
+        tuple
+            (nodes, lengths): int32 matched nodes of all trajectories and int64 length of each sequence.
+        """
+        nodes = self.match_points(points[:, 0], points[:, 1])
+        trajectory = np.repeat(np.arange(len(lengths)), lengths)
+
+        # drop unmatched points, then consecutive duplicates within a trajectory
+        matched = nodes >= 0
+        nodes, trajectory = nodes[matched], trajectory[matched]
+        if collapse and len(nodes) > 0:
+            new_node = np.ones(len(nodes), dtype=bool)
+            new_node[1:] = (nodes[1:] != nodes[:-1]) | (trajectory[1:] != trajectory[:-1])
+            nodes, trajectory = nodes[new_node], trajectory[new_node]
+        return nodes, np.bincount(trajectory, minlength=len(lengths)).astype(np.int64)
+
+
+def init_worker(store_dir, graph_file, k, max_distance):
+    global _matcher, _store
+    _matcher = MapMatcher(RoadGraphCache.for_graph_file(graph_file), k=k, max_distance=max_distance)
+    _store = TrajectoryStore.load(store_dir)
+
+
+def match_chunk(start, stop, collapse=True):
+    """
+    Matches trajectories [start, stop) of the worker's (memory-mapped) store.
+    """
+    offsets = _store.offsets[start:stop + 1]
+    points = np.asarray(_store.points[offsets[0]:offsets[-1]])
+    return _matcher.match(points, np.diff(offsets), collapse)
+
+
+def match_store(store_dir, graph_file, output_dir, chunk_size=20000, workers=None, k=8, max_distance=50.0, collapse=True):
+    """
+    Map-matches a whole TrajectoryStore on a process pool, one chunk of trajectories per task, in one pass.
+
+    Returns:
+    -------
+    NodeSequences
+        The node sequences, aligned with the trajectories of the store (empty when no point matched).
+    """
+    nb_trajectories = len(TrajectoryStore.load(store_dir))
+    starts = list(range(0, nb_trajectories, chunk_size))
+    stops = [min(start + chunk_size, nb_trajectories) for start in starts]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(store_dir, graph_file, k, max_distance)) as executor:
+        chunks = list(executor.map(match_chunk, starts, stops, [collapse] * len(starts)))
+
+    nodes = np.concatenate([chunk[0] for chunk in chunks]) if chunks else np.empty(0, dtype=np.int32)
+    lengths = np.concatenate([chunk[1] for chunk in chunks]) if chunks else np.empty(0, dtype=np.int64)
+    sequences = NodeSequences(nodes, lengths_to_offsets(lengths))
+    sequences.save(output_dir, graph_file=Path(graph_file).name, k=k, max_distance=max_distance, collapse=collapse)
+    return sequences
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Map-match the Porto or Geolife trajectories to road-graph node sequences.")
+    parser.add_argument("--city", choices=["porto", "beijing"], required=True)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=20000, help="trajectories per task")
+    parser.add_argument("--k", type=int, default=8, help="candidate nodes per point")
+    parser.add_argument("--max-distance", type=float, default=50.0, help="meters from the road graph beyond which a point is dropped")
+    parser.add_argument("--no-collapse", action="store_true", help="keep consecutive duplicate nodes")
+    args = parser.parse_args()
+
+    store_dir, graph_file, output_dir = city_files[args.city]
+    sequences = match_store(store_dir, graph_file, output_dir, args.chunk_size, args.workers, args.k, args.max_distance, not args.no_collapse)
+    print(f"{len(sequences)} trajectories, {len(sequences.nodes)} nodes -> {output_dir}")
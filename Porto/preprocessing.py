@@ -1,15 +1,20 @@
 # Read in the Porto data from train.csv, drop irrelevant columns and save it to porto.pkl for further use.
+import argparse
+import numpy as np
 import pandas as pd
 import pickle
 
 from pathlib import Path
 from Porto.constants import PORTO_CENTERPOINT, PORTO_RADIUS
+from Porto.graph_cache import RoadGraphCache, cache_dir
 from Porto.roadgraph import roadgraph
+from Porto.trajectory_store import TrajectoryStore
 
 ## file imports
 main_dir = Path(__file__).parent.parent
 raw_porto_data = main_dir / "Porto" / "Data" / "train.csv"
 processed_porto_data = main_dir / "Porto" / "data" / "porto.pkl"
+porto_store = main_dir / "Porto" / "data" / "porto_store"
 graph_file = main_dir / "Porto" / "data" / "porto_graph.pkl"
 porto_constants_file = main_dir / "Porto" / "constants.py"
 
@@ -25,16 +30,41 @@ def create_porto_df(raw_data_path=raw_porto_data, output_path=processed_porto_da
     porto_df.to_pickle(output_path)
 
 
+def create_porto_store(raw_data_path=raw_porto_data, output_dir=porto_store, chunksize=100000):
+    """
+    Streams train.csv in chunks into a TrajectoryStore with the TRIP_ID, TAXI_ID and TIMESTAMP columns.
+    """
+    chunks = pd.read_csv(raw_data_path, usecols=["TRIP_ID", "TAXI_ID", "TIMESTAMP", "POLYLINE"], chunksize=chunksize)
+    stores = []
+    for chunk in chunks:
+        columns = {name: chunk[name].to_numpy(dtype=np.int64) for name in ["TRIP_ID", "TAXI_ID", "TIMESTAMP"]}
+        stores.append(TrajectoryStore.from_polylines(chunk["POLYLINE"].tolist(), columns))
+
+    store = TrajectoryStore.concatenate(stores)
+    store.save(output_dir)
+    return store
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Porto trajectories and road graph extraction.")
+    parser.add_argument("--osm-file", default=None, help="local .osm/.osm.pbf extract to build the road graph offline")
+    args = parser.parse_args()
+
     # Read in the raw data
     create_porto_df()
 
+    # Flat, memory-mappable trajectory store
+    create_porto_store()
+
     # Create and store roadgraph
-    (_, G, _) = roadgraph(PORTO_CENTERPOINT, PORTO_RADIUS)
+    (_, G, _) = roadgraph(PORTO_CENTERPOINT, PORTO_RADIUS, osm_file=args.osm_file)
     node_list = list(G.nodes())
 
     with open(graph_file, 'wb') as f:
         pickle.dump(G, f)
+
+    # compact node/adjacency cache used by the audits
+    RoadGraphCache.from_graph(G).save(cache_dir(graph_file), graph_file)
     
     with open(porto_constants_file, 'a') as f:
         f.write(f'\nM = {len(node_list)}\n')
@@ -1,34 +1,199 @@
 #ROADMAP EXTRACTION and preprocessing as a graph
-#This program save public info of the road map in osm graphs format and geodataframe 
+#This program save public info of the road map in osm graphs format and geodataframe
+import hashlib
+import json
 import numpy as np
 import osmnx as ox
 import networkx as nx
+import pickle
+import re
+import shapely
+import shutil
+import subprocess
+import tempfile
+
+from pathlib import Path
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+from Porto.graph_cache import file_sha256
+
+# Overpass filter of OSMnx's 'drive' network type, as (tag, excluded values) pairs.
+# Like Overpass' !~ operator, a way is excluded as soon as the pattern matches anywhere in the tag.
+DRIVE_EXCLUDE = [
+    ("area", "yes"),
+    ("access", "private"),
+    ("highway", "abandoned|bridleway|bus_guideway|construction|corridor|cycleway|elevator|escalator|footway|no|path|"
+                "pedestrian|planned|platform|proposed|raceway|razed|service|steps|track"),
+    ("motor_vehicle", "no"),
+    ("motorcar", "no"),
+    ("service", "alley|driveway|emergency_access|parking|parking_aisle|private"),
+]
+ROADGRAPH_CACHE_VERSION = 1
 
 
 #Extract a circle map function:
-def roadgraph(centre_point,radius): 
-    #Extract osm graph (nodes=intersections,edges=streets) and save in variable G
-    G = ox.graph_from_point(centre_point,radius, dist_type='bbox', network_type='drive', simplify=True)
-    #Remove the not strongly conected components of G (otherwise diameter=inifnity)
-    if not nx.is_strongly_connected(G):
-        G = nx.subgraph(G, max(nx.strongly_connected_components(G), key=len)).copy()
-    #Obtain the line graph (nodes=streets,edges=intersection) and save in variable line_G 
+def roadgraph(centre_point,radius,osm_file=None,network_type='drive',cache_directory=None):
+    """
+    Road graph around a centre point, its line graph and the positions of the line-graph nodes.
+
+    Parameters:
+    ----------
+    centre_point : tuple
+        (lat, lon) centre.
+    radius : float
+        Half side, in meters, of the bounding box around the centre.
+    osm_file : str or Path or None
+        Local `.osm` or `.osm.pbf` extract to build the graph from instead of querying
+        Overpass. `.osm.pbf` files are cropped to the box with the `osmium` command-line tool.
+    network_type : str
+        'drive' (the OSMnx filter is applied to local extracts) or, for local extracts, 'all'.
+    cache_directory : str or Path or None
+        Where graphs built from local extracts are cached (default: `roadgraph_cache/` next to the extract).
+
+    Returns:
+    -------
+    tuple
+        (line_G, G, pos).
+    """
+    if osm_file is None:
+        #Extract osm graph (nodes=intersections,edges=streets) and save in variable G
+        G = ox.graph_from_point(centre_point,radius, dist_type='bbox', network_type=network_type, simplify=True)
+        G = prepare_graph(G)
+    else:
+        G = cached_graph_from_osm_file(osm_file, centre_point, radius, network_type, cache_directory)
+
+    #Obtain the line graph (nodes=streets,edges=intersection) and save in variable line_G
     line_G = nx.line_graph(G)
     #add labels from original graph to line_G
     line_G.add_nodes_from((node, G.edges[node]) for node in line_G)
 
+    #Just for PLOTS nx.draw()
+    pos = line_graph_positions(G, line_G)
+
+    return (line_G,G,pos)
+
+
+def prepare_graph(G):
+    #Remove the not strongly conected components of G (otherwise diameter=inifnity)
+    G = largest_strongly_connected_component(G)
+
     # add edge information
     G = ox.add_edge_speeds(G)
     G = ox.add_edge_travel_times(G)
-    
-    #Just for PLOTS nx.draw()
-    #calculate the pos of edge. Using the mean of Linestring, (Linestring is the shape of the street, you can also use the median). 
-    #If Linestring is not recorded, still use the mean of xy of two cross.
-    pos = {}
-    for node, data in line_G.nodes(data=True):
-        if 'geometry' in data:
-            pos[node] = np.mean(np.array(data['geometry'].coords.xy), axis=1)
+    return G
+
+
+def largest_strongly_connected_component(G):
+    """
+    Largest strongly connected component of G, computed with scipy on the edge arrays.
+    """
+    nodes = list(G.nodes())
+    node_index = {node: idx for idx, node in enumerate(nodes)}
+    edges = np.array([(node_index[u], node_index[v]) for u, v in G.edges()], dtype=np.int64).reshape(-1, 2)
+    adjacency = csr_matrix((np.ones(len(edges)), (edges[:, 0], edges[:, 1])), shape=(len(nodes), len(nodes)))
+
+    nb_components, labels = connected_components(adjacency, directed=True, connection='strong')
+    if nb_components == 1:
+        return G
+    largest = np.argmax(np.bincount(labels))
+    return nx.subgraph(G, [nodes[idx] for idx in np.flatnonzero(labels == largest)]).copy()
+
+
+def line_graph_positions(G, line_G):
+    """
+    Position of every street (line-graph node): the mean of its LineString coordinates,
+    or of the coordinates of its two end intersections if the LineString is not recorded.
+    """
+    streets = list(line_G.nodes())
+    geometries = [line_G.nodes[street].get('geometry') for street in streets]
+    has_geometry = np.array([geometry is not None for geometry in geometries], dtype=bool)
+    positions = np.empty((len(streets), 2))
+
+    if has_geometry.any():
+        coords, index = shapely.get_coordinates([geometry for geometry in geometries if geometry is not None], return_index=True)
+        nb_coords = np.bincount(index, minlength=has_geometry.sum())
+        positions[has_geometry, 0] = np.bincount(index, weights=coords[:, 0], minlength=len(nb_coords)) / nb_coords
+        positions[has_geometry, 1] = np.bincount(index, weights=coords[:, 1], minlength=len(nb_coords)) / nb_coords
+
+    if not has_geometry.all():
+        ends = np.array([(street[0], street[1]) for street, geometry in zip(streets, geometries) if geometry is None])
+        xy = {node: (data['x'], data['y']) for node, data in G.nodes(data=True)}
+        positions[~has_geometry] = (np.array([xy[u] for u in ends[:, 0]]) + np.array([xy[v] for v in ends[:, 1]])) / 2
+
+    return dict(zip(streets, positions))
+
+
+def is_drivable(data):
+    if 'highway' not in data:
+        return False
+    for tag, pattern in DRIVE_EXCLUDE:
+        value = data.get(tag)
+        if value is not None and re.search(pattern, str(value)):
+            return False
+    return True
+
+
+def osm_xml_extract(osm_file, bbox, output_file):
+    """
+    Crops an .osm.pbf extract to a (left, bottom, right, top) box as OSM XML with the osmium tool.
+    """
+    if shutil.which('osmium') is None:
+        raise RuntimeError("Reading .osm.pbf extracts requires the osmium command-line tool (osmium-tool); "
+                           "install it or convert the extract to .osm first.")
+    left, bottom, right, top = bbox
+    subprocess.run(['osmium', 'extract', '--bbox', f'{left},{bottom},{right},{top}', '--strategy', 'complete_ways',
+                    '--overwrite', '-o', str(output_file), str(osm_file)], check=True)
+    return output_file
+
+
+def graph_from_osm_file(osm_file, centre_point, radius, network_type='drive'):
+    """
+    Offline equivalent of ox.graph_from_point(..., dist_type='bbox', simplify=True) on a local extract.
+    """
+    if network_type not in ('drive', 'all'):
+        raise ValueError(f"Unsupported network type for local extracts: {network_type}")
+    osm_file = Path(osm_file)
+    bbox = ox.utils_geo.bbox_from_point(centre_point, dist=radius)
+
+    # the drive filter needs these way tags as edge attributes
+    useful_tags_way = ox.settings.useful_tags_way
+    ox.settings.useful_tags_way = list(dict.fromkeys(useful_tags_way + [tag for tag, _ in DRIVE_EXCLUDE]))
+    try:
+        if osm_file.name.endswith('.pbf'):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                G = ox.graph_from_xml(osm_xml_extract(osm_file, bbox, Path(tmp_dir) / 'extract.osm'), simplify=False, retain_all=True)
         else:
-            pos[node] = np.mean(np.array([[G.nodes[node[0]]['x'], G.nodes[node[1]]['x']], [G.nodes[node[0]]['y'], G.nodes[node[1]]['y']]]), axis=1)
+            G = ox.graph_from_xml(osm_file, simplify=False, retain_all=True)
+    finally:
+        ox.settings.useful_tags_way = useful_tags_way
+
+    G = ox.truncate.truncate_graph_bbox(G, bbox)
+    if network_type == 'drive':
+        G.remove_edges_from([(u, v, k) for u, v, k, data in G.edges(keys=True, data=True) if not is_drivable(data)])
+        G.remove_nodes_from(list(nx.isolates(G)))
+    return ox.simplify_graph(G)
+
+
+def roadgraph_cache_key(centre_point, radius, network_type, extract_sha256):
+    key = {"version": ROADGRAPH_CACHE_VERSION, "centre": list(centre_point), "radius": radius,
+           "network_type": network_type, "extract": extract_sha256}
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def cached_graph_from_osm_file(osm_file, centre_point, radius, network_type='drive', cache_directory=None):
+    """
+    Road graph of a local extract, cached under a key of (centre, radius, network type, extract hash).
+    """
+    osm_file = Path(osm_file)
+    cache_directory = Path(cache_directory) if cache_directory is not None else osm_file.with_name('roadgraph_cache')
+    cache_file = cache_directory / f"{roadgraph_cache_key(centre_point, radius, network_type, file_sha256(osm_file))}.pkl"
+    if cache_file.exists():
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f)
 
-    return (line_G,G,pos)
\ No newline at end of file
+    G = prepare_graph(graph_from_osm_file(osm_file, centre_point, radius, network_type))
+    cache_directory.mkdir(parents=True, exist_ok=True)
+    with open(cache_file, 'wb') as f:
+        pickle.dump(G, f)
+    return G
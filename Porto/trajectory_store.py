@@ -0,0 +1,214 @@
+# Ragged-array store of GPS trajectories: all points in one flat float32 (lat, lon) array, trajectory
+# offsets and per-trajectory (and optionally per-point) metadata columns, as memory-mappable .npy files.
+# Used for the Porto taxi trips and the Geolife trajectories.
+import json
+import numpy as np
+
+from pathlib import Path
+
+from Porto.constants import PORTO_CENTERPOINT, PORTO_RADIUS
+
+STORE_VERSION = 1
+EARTH_RADIUS = 6371008.8
+BRACKETS = str.maketrans("", "", "[]")
+
+
+def parse_polylines(polylines):
+    """
+    Parses POLYLINE strings ("[[lon,lat],[lon,lat],...]") in one pass.
+
+    Returns:
+    -------
+    tuple
+        (lat, lon, lengths): the float64 coordinates of all points, trajectory after
+        trajectory, and the number of points of each trajectory.
+    """
+    lengths = np.array([polyline.count("[") - 1 if len(polyline) > 2 else 0 for polyline in polylines], dtype=np.int64)
+    text = ",".join(polyline for polyline in polylines if len(polyline) > 2).translate(BRACKETS)
+    coords = np.fromstring(text, sep=",") if text else np.empty(0)
+    coords = coords.reshape(-1, 2)
+    return coords[:, 1], coords[:, 0], lengths
+
+
+def project(lat, lon, center):
+    """
+    Equirectangular projection to meters around a (lat, lon) center, accurate at city scale.
+    """
+    lat0, lon0 = np.radians(center[0]), np.radians(center[1])
+    x = EARTH_RADIUS * np.cos(lat0) * (np.radians(lon) - lon0)
+    y = EARTH_RADIUS * (np.radians(lat) - lat0)
+    return np.column_stack((x, y))
+
+
+def haversine(lat, lon, center):
+    """
+    Great-circle distance in meters between points and a (lat, lon) center.
+    """
+    lat, lon = np.radians(lat), np.radians(lon)
+    lat0, lon0 = np.radians(center[0]), np.radians(center[1])
+    a = np.sin((lat - lat0) / 2)**2 + np.cos(lat) * np.cos(lat0) * np.sin((lon - lon0) / 2)**2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+def lengths_to_offsets(lengths):
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+class TrajectoryStore:
+    """
+    Trajectories as ragged arrays.
+
+    Attributes:
+    ----------
+    points : np.ndarray
+        float32 array of shape (nb_points, 2) with the (lat, lon) of all points, trajectory after trajectory.
+    offsets : np.ndarray
+        int64 array of length len(store)+1; the points of trajectory i are points[offsets[i]:offsets[i+1]].
+    columns : dict
+        Per-trajectory metadata arrays (e.g. TRIP_ID, TAXI_ID, TIMESTAMP).
+    point_columns : dict
+        Per-point arrays aligned with `points` (e.g. ts).
+    """
+
+    def __init__(self, points, offsets, columns=None, point_columns=None, header=None):
+        self.points = points
+        self.offsets = offsets
+        self.columns = columns or {}
+        self.point_columns = point_columns or {}
+        self.header = header or {}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        """
+        (lat, lon) points of trajectory i, as a view into `points`.
+        """
+        return self.points[self.offsets[i]:self.offsets[i + 1]]
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def point_column(self, name, i):
+        """
+        View of a per-point column over trajectory i.
+        """
+        return self.point_columns[name][self.offsets[i]:self.offsets[i + 1]]
+
+    @classmethod
+    def from_polylines(cls, polylines, columns=None):
+        """
+        Builds a store from Porto POLYLINE strings and their per-trajectory metadata columns.
+        """
+        lat, lon, lengths = parse_polylines(polylines)
+        points = np.column_stack((lat, lon)).astype(np.float32)
+        return cls(points, lengths_to_offsets(lengths), columns)
+
+    @classmethod
+    def concatenate(cls, stores):
+        """
+        Concatenates stores with the same columns, e.g. the chunks of a streamed CSV.
+        """
+        stores = list(stores)
+        points = np.concatenate([store.points for store in stores]).reshape(-1, 2)
+        lengths = np.concatenate([store.lengths for store in stores])
+        columns = {name: np.concatenate([store.columns[name] for store in stores]) for name in stores[0].columns}
+        point_columns = {name: np.concatenate([store.point_columns[name] for store in stores]) for name in stores[0].point_columns}
+        return cls(points, lengths_to_offsets(lengths), columns, point_columns)
+
+    def save(self, directory):
+        """
+        Writes one .npy file per array and a JSON header listing the columns.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / "points.npy", self.points)
+        np.save(directory / "offsets.npy", self.offsets)
+        for name, values in {**self.columns, **self.point_columns}.items():
+            np.save(directory / f"{name}.npy", values)
+
+        self.header = {
+            "version": STORE_VERSION,
+            "nb_trajectories": len(self),
+            "nb_points": int(len(self.points)),
+            "columns": list(self.columns),
+            "point_columns": list(self.point_columns),
+        }
+        with open(directory / "header.json", "w") as f:
+            json.dump(self.header, f, indent=4)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        """
+        Loads a store written by `save`, memory-mapping the arrays by default.
+        """
+        directory = Path(directory)
+        with open(directory / "header.json", "r") as f:
+            header = json.load(f)
+        if header.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported trajectory store version in {directory}: {header.get('version')}")
+
+        def load_array(name):
+            return np.load(directory / f"{name}.npy", mmap_mode=mmap_mode)
+
+        return cls(load_array("points"), load_array("offsets"),
+                   {name: load_array(name) for name in header["columns"]},
+                   {name: load_array(name) for name in header["point_columns"]},
+                   header)
+
+    def in_time_window(self, start, end, column="TIMESTAMP"):
+        """
+        Boolean mask of the trajectories whose `column` (Unix seconds) lies in [start, end).
+        """
+        values = np.asarray(self.columns[column])
+        return (values >= start) & (values < end)
+
+    def within_radius(self, center=PORTO_CENTERPOINT, radius=PORTO_RADIUS, require="all", chunk_size=1 << 24):
+        """
+        Boolean mask of the trajectories within `radius` meters of `center`.
+
+        Parameters:
+        ----------
+        center : tuple
+            (lat, lon) center.
+        radius : float
+            Radius in meters.
+        require : str
+            "all" keeps trajectories whose points all lie inside (empty ones included),
+            "any" those with at least one point inside.
+        chunk_size : int
+            Points per vectorized distance computation, bounding the memory use.
+
+        Returns:
+        -------
+        np.ndarray
+            Boolean mask of length len(store).
+        """
+        inside = np.empty(len(self.points), dtype=bool)
+        for start in range(0, len(self.points), chunk_size):
+            chunk = np.asarray(self.points[start:start + chunk_size], dtype=np.float64)
+            inside[start:start + chunk_size] = haversine(chunk[:, 0], chunk[:, 1], center) <= radius
+
+        # points inside per trajectory, from the running count
+        running = np.zeros(len(inside) + 1, dtype=np.int64)
+        np.cumsum(inside, out=running[1:])
+        nb_inside = running[self.offsets[1:]] - running[self.offsets[:-1]]
+        if require == "all":
+            return nb_inside == self.lengths
+        if require == "any":
+            return nb_inside > 0
+        raise ValueError(f"Unsupported requirement: {require}")
+
+    def subset(self, mask):
+        """
+        In-memory store with the trajectories selected by a boolean mask or an index array.
+        """
+        selected = np.arange(len(self))[mask]
+        lengths = self.lengths[selected]
+        point_idx = np.repeat(self.offsets[:-1][selected] - lengths_to_offsets(lengths)[:-1], lengths) + np.arange(lengths.sum())
+        columns = {name: np.asarray(values)[selected] for name, values in self.columns.items()}
+        point_columns = {name: np.asarray(values)[point_idx] for name, values in self.point_columns.items()}
+        return TrajectoryStore(np.asarray(self.points)[point_idx], lengths_to_offsets(lengths), columns, point_columns)
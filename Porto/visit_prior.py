@@ -0,0 +1,127 @@
+# Stream the POLYLINE column of the Porto train.csv, snap every GPS point to the nearest node of the
+# road graph and accumulate a visit-count vector over the graph nodes (in graph-cache node order).
+# The result is a data-derived prior for the graph audits (`python -m DP_Audit.run --prior ...`).
+import argparse
+import numpy as np
+import os
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from scipy.spatial import cKDTree
+
+from Porto.constants import PORTO_CENTERPOINT
+from Porto.graph_cache import RoadGraphCache
+from Porto.trajectory_store import parse_polylines, project
+
+## file imports
+main_dir = Path(__file__).parent.parent
+raw_porto_data = main_dir / "Porto" / "Data" / "train.csv"
+graph_file = main_dir / "Porto" / "data" / "porto_graph.pkl"
+visit_counts_file = main_dir / "Porto" / "data" / "porto_visit_counts.npy"
+
+
+# per-process state of the workers
+_tree = None
+_m = None
+_max_distance = None
+
+
+def init_worker(graph_path, max_distance):
+    global _tree, _m, _max_distance
+    cache = RoadGraphCache.for_graph_file(graph_path)
+    _tree = cKDTree(project(np.asarray(cache.lat), np.asarray(cache.lon), PORTO_CENTERPOINT))
+    _m = cache.m
+    _max_distance = max_distance
+
+
+def count_visits(polylines, collapse=True):
+    """
+    Visit counts of one chunk of trips over the graph nodes.
+
+    Points farther than the worker's maximum distance from every node (outside the
+    road graph) are dropped. With `collapse`, consecutive points of a trip snapped to
+    the same node count as one visit.
+    """
+    lat, lon, lengths = parse_polylines(polylines)
+    if len(lat) == 0:
+        return np.zeros(_m, dtype=np.int64)
+
+    distances, nodes = _tree.query(project(lat, lon, PORTO_CENTERPOINT), distance_upper_bound=_max_distance)
+    trip = np.repeat(np.arange(len(lengths)), lengths)
+    on_graph = np.isfinite(distances)
+    nodes, trip = nodes[on_graph], trip[on_graph]
+
+    if collapse and len(nodes) > 0:
+        new_visit = np.ones(len(nodes), dtype=bool)
+        new_visit[1:] = (nodes[1:] != nodes[:-1]) | (trip[1:] != trip[:-1])
+        nodes = nodes[new_visit]
+    return np.bincount(nodes, minlength=_m).astype(np.int64)
+
+
+def visit_counts(raw_data_path=raw_porto_data, graph_path=graph_file, chunksize=50000, workers=None, max_distance=100.0, collapse=True):
+    """
+    Streams `train.csv` in chunks and accumulates the node visit counts on a process pool.
+
+    At most two chunks per worker are in flight, so the memory use does not depend on the size of the CSV.
+
+    Parameters:
+    ----------
+    raw_data_path : Path
+        Porto `train.csv`.
+    graph_path : Path
+        Road graph pickle; its node cache defines the node order.
+    chunksize : int
+        Trips per chunk.
+    workers : int or None
+        Number of processes (default: all cores).
+    max_distance : float
+        GPS points farther than this many meters from every node are dropped.
+    collapse : bool
+        Count consecutive points of a trip at the same node once.
+
+    Returns:
+    -------
+    np.ndarray
+        int64 visit count of each node.
+
+    Raises:
+    ------
+    ValueError
+        If the CSV holds no trips, or none of their points is near the road graph.
+    """
+    workers = workers or os.cpu_count()
+    counts = None
+    chunks = pd.read_csv(raw_data_path, usecols=["POLYLINE"], chunksize=chunksize)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(graph_path, max_distance)) as executor:
+        pending = set()
+        for chunk_idx, chunk in enumerate(chunks):
+            pending.add(executor.submit(count_visits, chunk["POLYLINE"].tolist(), collapse))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    counts = future.result() if counts is None else counts + future.result()
+            if chunk_idx % 20 == 0:
+                print(f"{(chunk_idx + 1) * chunksize} trips read")
+
+        for future in pending:
+            counts = future.result() if counts is None else counts + future.result()
+
+    if counts is None or not counts.any():
+        raise ValueError(f"No visits in {raw_data_path}: it has no trips, or none of their points lies within {max_distance} m of the road graph")
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Node visit counts of the Porto taxi trips, as a prior for the graph audits.")
+    parser.add_argument("--chunksize", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--max-distance", type=float, default=100.0, help="meters from the nearest node beyond which a point is dropped")
+    parser.add_argument("--no-collapse", action="store_true", help="count every GPS point instead of every visit")
+    parser.add_argument("--output", default=visit_counts_file)
+    args = parser.parse_args()
+
+    counts = visit_counts(chunksize=args.chunksize, workers=args.workers, max_distance=args.max_distance, collapse=not args.no_collapse)
+    np.save(args.output, counts)
+    print(f"{counts.sum()} visits over {np.count_nonzero(counts)}/{len(counts)} nodes -> {args.output}")
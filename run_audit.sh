@@ -6,17 +6,11 @@ read dataset
 case "$dataset" in
   porto)
     echo "Running DP audit on Porto dataset."
-    python -m DP_Audit.GRR.empirical_eps_porto &
-    python -m DP_Audit.SS.empirical_eps_porto &
-    python -m DP_Audit.UE.empirical_eps_oue_porto &
-    wait
+    python -m DP_Audit.run --city porto --mechanisms GRR SS OUE
     ;;
   beijing)
     echo "Running DP audit on Beijing dataset."
-    python -m DP_Audit.GRR.empirical_eps_beijing &
-    python -m DP_Audit.SS.empirical_eps_beijing &
-    python -m DP_Audit.UE.empirical_eps_oue_beijing &
-    wait
+    python -m DP_Audit.run --city beijing --mechanisms GRR SS OUE
     ;;
   *)
     echo "Invalid choice: $dataset. Please choose either 'porto' or 'beijing'."